@@ -0,0 +1,71 @@
+from collections import namedtuple
+
+from models import db, Question, CorrectAnswer, ReadingPassage, ListeningAudio
+from section_cache import VersionedSectionCache
+
+
+# Answer-key index for objective sections
+#
+# An AnswerKey maps question_id -> QuestionKey(correct, points), where
+# ``correct`` is a frozenset of option ids, or of (row_id, column_id) pairs
+# for table questions. Keys are built with a single query per section and
+# reused until the section's version changes in the section cache. Scoring
+# against a key lives in scoring.py.
+
+QuestionKey = namedtuple('QuestionKey', ['correct', 'points'])
+
+
+def question_points(question_type, correct_count):
+    # Multiple-selection and table questions are worth 2, everything else 1
+    if question_type in ('prose_summary', 'table') and correct_count > 1:
+        return 2
+    return 1
+
+
+class AnswerKey:
+    def __init__(self, section_id, questions, version=None):
+        self.section_id = section_id
+        self.questions = questions
+        self.version = version  # the section's cache_version when the key was read
+        self.max_score = sum(q.points for q in questions.values())
+
+
+def load_answer_key(section_id, section_type, version=None):
+    """Build the AnswerKey of a reading or listening section in one query.
+    ``version`` must have been read before the key, so the key is never
+    older than the version it is stamped with."""
+    if section_type == 'reading':
+        group, question_fk = ReadingPassage, Question.reading_passage_id
+    else:
+        group, question_fk = ListeningAudio, Question.listening_audio_id
+
+    rows = (
+        db.session.query(Question.id, Question.type, CorrectAnswer.option_id,
+                         CorrectAnswer.table_row_id, CorrectAnswer.table_column_id)
+        .join(group, question_fk == group.id)
+        .outerjoin(CorrectAnswer, CorrectAnswer.question_id == Question.id)
+        .filter(group.section_id == section_id)
+        .all()
+    )
+
+    types, corrects = {}, {}
+    for question_id, question_type, option_id, row_id, column_id in rows:
+        types[question_id] = question_type
+        answers = corrects.setdefault(question_id, set())
+        if question_type == 'table':
+            if row_id is not None and column_id is not None:
+                answers.add((row_id, column_id))
+        elif option_id is not None:
+            answers.add(option_id)
+
+    return AnswerKey(section_id, {
+        question_id: QuestionKey(frozenset(answers), question_points(types[question_id], len(answers)))
+        for question_id, answers in corrects.items()
+    }, version)
+
+
+class AnswerKeyIndex(VersionedSectionCache):
+    """Per-section AnswerKeys, rebuilt when the section cache version moves."""
+
+    def load(self, section_id, section_type, version):
+        return load_answer_key(section_id, section_type, version)
@@ -0,0 +1,31 @@
+from models import db, Attempt, UserAnswer
+
+
+# Append-only persistence of objective answers
+#
+# Every submission becomes a new Attempt carrying its score, and its answers
+# are appended with one multi-row INSERT. Nothing is deleted or rewritten,
+# so earlier attempts stay available as history.
+
+def answer_row(user_id, question_id, option_id=None, table_row_id=None, table_column_id=None):
+    # Every row carries the same keys so the INSERT runs as a single executemany
+    return {
+        'user_id': user_id,
+        'question_id': question_id,
+        'option_id': option_id,
+        'table_row_id': table_row_id,
+        'table_column_id': table_column_id
+    }
+
+
+def record_attempt(user_id, section_id, section_type, rows, score, max_score, key_version=None):
+    """Append a scored attempt and its answers. Runs inside the caller's
+    transaction; the caller commits."""
+    attempt = Attempt(user_id=user_id, section_id=section_id, section_type=section_type,
+                      score=score, max_score=max_score, key_version=key_version)
+    db.session.add(attempt)
+    db.session.flush()  # attempt.id is needed by the answer rows
+
+    if rows:
+        db.session.execute(db.insert(UserAnswer), [dict(row, attempt_id=attempt.id) for row in rows])
+    return attempt
@@ -1,19 +1,29 @@
-from flask import Flask, request, jsonify, send_file, abort
-from werkzeug.utils import secure_filename
+from flask import Flask, Response, request, jsonify, abort, g, stream_with_context
 import datetime
 import jwt
-from functools import wraps
 import os
 import json
 
 from flask_cors import CORS
 
+from uploads import StagingRequest, UploadPool, persist_upload
+from media_store import BLOB_FOLDER, MediaGarbageCollector
+from media_delivery import DELIVERY_MODES, media_response
+from scoring import SCORING_MODES, scale, score_submission, write_scores
+from request_log import RequestLogger
+from metrics import RequestMetrics
+from compression import compress_response, send_encoded
+from passwords import PasswordHasher, HasherBusy
+from auth import admin_required, admin_required_with_id, student_required, token_required
+
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = StagingRequest  # stream uploaded files to disk while parsing
 CORS(app, resources={r"/*": {
     "origins": "http://localhost:5173",  # Match your React frontend origin
     "methods": ["GET", "POST", "OPTIONS"],  # Include OPTIONS for preflight
-    "allow_headers": ["Content-Type", "Authorization"]  # Allow JSON headers
+    "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],  # Allow JSON and conditional GET headers
+    "expose_headers": ["ETag"]
 }})
 
 # Load configuration from environment variables
@@ -21,100 +31,61 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = os.environ.get('SQLALCHEMY_TRACK_MODIFICATIONS')
 app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER')
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+app.config['SECTION_CACHE_SIZE'] = int(os.environ.get('SECTION_CACHE_SIZE', 256))
+app.config['SECTION_CACHE_DIR'] = os.environ.get('SECTION_CACHE_DIR')  # optional, payloads shared by the workers of a host
+app.config['UPLOAD_WORKERS'] = int(os.environ.get('UPLOAD_WORKERS', 4))
+app.config['MEDIA_GC_INTERVAL'] = int(os.environ.get('MEDIA_GC_INTERVAL', 3600))  # seconds, 0 disables the collector
+app.config['MEDIA_GC_GRACE'] = int(os.environ.get('MEDIA_GC_GRACE', 3600))  # never collect files younger than this
+app.config['MEDIA_DELIVERY'] = os.environ.get('MEDIA_DELIVERY', 'app')  # app, sendfile, x-accel or x-sendfile (see media_delivery.py)
+app.config['MEDIA_ACCEL_PREFIX'] = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-files')  # nginx internal location mapped to BASE_DIR
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')  # werkzeug method, e.g. scrypt:32768:8:1 or pbkdf2:sha256:600000
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # hashes running at once
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))  # hashes waiting before /login answers 503
+app.config['SCORING_MODE'] = os.environ.get('SCORING_MODE', 'all_or_nothing')  # or partial (see scoring.py)
+app.config['RESCORE_PROCESSES'] = int(os.environ.get('RESCORE_PROCESSES', 2))  # processes scoring re-scoring jobs
+app.config['SPEAKING_MEDIA_PROCESSES'] = int(os.environ.get('SPEAKING_MEDIA_PROCESSES', 2))  # processes transcoding speaking recordings
+app.config['SPEAKING_AUDIO_BITRATE'] = os.environ.get('SPEAKING_AUDIO_BITRATE', '64k')  # MP3 bitrate recordings are transcoded to (needs ffmpeg)
+app.config['SPEAKING_MAX_SECONDS'] = int(os.environ.get('SPEAKING_MAX_SECONDS', 600))  # longer recordings are marked invalid
+app.config['GRADING_LEASE_SECONDS'] = int(os.environ.get('GRADING_LEASE_SECONDS', 900))  # a claimed review returns to the queue after this
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes; smaller JSON responses are sent as is
+app.config['REQUEST_LOG_SAMPLE_RATE'] = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0.0))  # fraction of write requests whose body is logged
+app.config['REQUEST_LOG_MAX_BODY'] = int(os.environ.get('REQUEST_LOG_MAX_BODY', 2048))  # characters per logged body
 # too early to include these (deal with the error it brings)
 # app.config['MAX_CONTENT_LENGTH'] = os.environ.get('MAX_CONTENT_LENGTH')
 # app.config['SEND_FILE_MAX_AGE_DEFAULT'] = os.environ.get('SEND_FILE_MAX_AGE_DEFAULT')
 
 
 
+if app.config['SCORING_MODE'] not in SCORING_MODES:
+    raise ValueError(f"SCORING_MODE must be one of {', '.join(SCORING_MODES)}")
+if app.config['MEDIA_DELIVERY'] not in DELIVERY_MODES:
+    raise ValueError(f"MEDIA_DELIVERY must be one of {', '.join(DELIVERY_MODES)}")
+
 # Ensure upload folder and subfolders exist
-folders = ['listening_audios', 'listening_photos', 'question_audios', 'speaking_audios', 'writing_audios']
+folders = [BLOB_FOLDER]
 for folder in folders:
     path = os.path.join(app.config['UPLOAD_FOLDER'], folder)
     if not os.path.exists(path):
         os.makedirs(path)
 
 
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Missing token'}), 401
-        try:
-            token = token.split(" ")[1]  # Expecting 'Bearer <token>'
-            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            if not payload.get('role') or payload.get('role') != 'admin' :
-                return jsonify({'error': 'Admin privileges required'}), 403
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        return f(*args, **kwargs)
-    return decorated_function
-
-def admin_required_with_id(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Missing token'}), 401
-        try:
-            token = token.split(" ")[1]  # Expecting 'Bearer <token>'
-            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            if not payload.get('role') or payload.get('role') != 'admin' :
-                return jsonify({'error': 'Admin privileges required'}), 403
-            admin_id = payload['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        return f(admin_id, *args, **kwargs)
-    return decorated_function
-
-
-def student_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        try:
-            token = token.split(" ")[1]  # Expecting 'Bearer <token>'
-            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            if not payload.get('role') or payload.get('role') != 'student' :
-                return jsonify({'error': 'Admin privileges required'}), 403
-            student_id = payload['user_id']
-        except Exception:
-            return jsonify({'error': 'Invalid token'}), 401
-        return f(student_id, *args, **kwargs)
-    return decorated
-
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-        try:
-            token = token.split(" ")[1]  # Expecting 'Bearer <token>'
-            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            user_id = payload['user_id']
-        except Exception:
-            return jsonify({'error': 'Invalid token'}), 401
-        return f(user_id, *args, **kwargs)
-    return decorated
-
-
-# Helper function to save files and generate URLs
-def save_file(file, subfolder):
+upload_pool = UploadPool(max_workers=app.config['UPLOAD_WORKERS'])
+password_hasher = PasswordHasher(method=app.config['PASSWORD_HASH_METHOD'],
+                                 max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                 max_pending=app.config['PASSWORD_HASH_QUEUE'])
+media_gc = MediaGarbageCollector(app, app.config['MEDIA_GC_INTERVAL'], app.config['MEDIA_GC_GRACE'])
+
+# Helper function to save files to the media store and generate URLs
+def save_file(file):
     if file:
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], subfolder, filename)
-        file.save(file_path)
-        return f'/{app.config["UPLOAD_FOLDER"]}/{subfolder}/{filename}'
+        return persist_upload(file, app.config['UPLOAD_FOLDER'])
     return None
 
+# Helper function to durably save several files in parallel before any DB work
+def save_files(files):
+    """Save a list of files (None entries allowed) and return their URLs in order."""
+    return upload_pool.persist_all(files, app.config['UPLOAD_FOLDER'])
+
 # Helper function to generate JWT token
 def generate_token(user):
     """Generate a JWT token for the user with a 24-hour expiration."""
@@ -130,12 +101,108 @@ def generate_token(user):
 from models import db, User, Section, ListeningAudio, ReadingPassage, \
                     Question, Option, TableQuestionRow, TableQuestionColumn, \
                     CorrectAnswer, SpeakingTask, WritingTask, QuestionAudio, \
-                    UserAnswer, SpeakingResponse, WritingResponse, Score
+                    SpeakingResponse, WritingResponse, Score, Attempt, Test, \
+                    RescoreJob, GradingItem
+from migrations import upgrade_schema
+from section_payloads import build_reading_payload, build_listening_payload, \
+                             build_speaking_payload, build_writing_payload
+from section_cache import SectionCache
+from answer_keys import AnswerKeyIndex
+from answer_store import answer_row, record_attempt
+from section_index import SectionIndexCache, table_cells
+from test_bundles import TestBundleCache
+from rescoring import RescoreRunner, job_payload
+import grading_queue
+from reviews import MAX_BULK_REVIEWS, bulk_review
+from results_export import EXPORT_FORMATS, export_chunks
+from speaking_media import SpeakingMediaPipeline
+from section_listing import SECTION_TYPES, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, list_sections
 
 db.init_app(app)
 
+section_cache = SectionCache(maxsize=app.config['SECTION_CACHE_SIZE'],
+                             shared_dir=app.config['SECTION_CACHE_DIR'])
+answer_keys = AnswerKeyIndex(section_cache)
+section_indexes = SectionIndexCache(section_cache)
+rescore_runner = RescoreRunner(app, processes=app.config['RESCORE_PROCESSES'])
+speaking_media = SpeakingMediaPipeline(app, processes=app.config['SPEAKING_MEDIA_PROCESSES'],
+                                       bitrate=app.config['SPEAKING_AUDIO_BITRATE'],
+                                       max_seconds=app.config['SPEAKING_MAX_SECONDS'],
+                                       on_done=media_gc.request_collection)  # raw uploads replaced by transcodes
+
+
+SECTION_BUILDERS = {
+    'reading': build_reading_payload,
+    'listening': build_listening_payload,
+    'speaking': build_speaking_payload,
+    'writing': build_writing_payload
+}
+
+
+def cached_section(section_type, section_id):
+    """The cached serialized payload of a section, or None if it does not exist."""
+    return section_cache.get_or_build(
+        section_type, section_id, SECTION_BUILDERS[section_type],
+        lambda payload: app.json.dumps(payload).encode('utf-8')
+    )
+
+
+test_bundles = TestBundleCache(cached_section)
+
+
+def record_scored_attempt(student_id, section_id, section_type, submitted, answer_rows):
+    """Score a submission against the cached answer key, record it as an
+    attempt and commit. Returns (attempt, ScoreResult)."""
+    answer_key = answer_keys.get(section_id, section_type)
+    result = score_submission(answer_key, submitted, app.config['SCORING_MODE'])
+    attempt = record_attempt(student_id, section_id, section_type, answer_rows,
+                             result.raw, result.max_score, key_version=answer_key.version)
+    db.session.commit()
+
+    # The key changed while this submission was scored, possibly after the
+    # re-scoring job's last read: score it again with the new key
+    version = section_cache.version(section_id)
+    if version is not None and version != answer_key.version:
+        answer_key = answer_keys.get(section_id, section_type)
+        result = score_submission(answer_key, submitted, app.config['SCORING_MODE'])
+        write_scores({attempt.id: result}, answer_key.version)
+        db.session.commit()
+    return attempt, result
+
+
+def has_attempts(section_id):
+    """Attempts are student history: a section that has any is kept."""
+    return db.session.query(Attempt.query.filter_by(section_id=section_id).exists()).scalar()
 
-def create_question(question_data, section_type, reading_passage_id=None, listening_audio_id=None, audio_file=None):
+
+def section_response(section_type, section_id):
+    """Serve a section payload from the cache, answering 304 when the
+    client's If-None-Match already holds the current version. Compressed
+    variants are cached with the payload."""
+    entry = cached_section(section_type, section_id)
+    if not entry:
+        return jsonify({'error': 'Section not found'}), 404
+
+    response = send_encoded(app.response_class(mimetype='application/json'), entry,
+                            request.accept_encodings, app.config['COMPRESS_MIN_SIZE'])
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate, the ETag makes that cheap
+    return response.make_conditional(request)
+
+
+def section_list_response(section_types):
+    """One page of sections. Query params: limit (max 500), cursor (from
+    next_cursor of the previous page), count=false to skip the total."""
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        with_total = request.args.get('count', 'true').lower() not in ('false', '0')
+        page = list_sections(section_types, limit=limit, cursor=request.args.get('cursor'),
+                             with_total=with_total)
+    except ValueError:  # includes InvalidCursor
+        return jsonify({'error': 'Invalid query parameters'}), 400
+    return jsonify(page), 200
+
+
+def create_question(question_data, section_type, reading_passage_id=None, listening_audio_id=None, audio_url=None):
     # Create the question
     question = Question(
         section_type=section_type,
@@ -151,11 +218,8 @@ def create_question(question_data, section_type, reading_passage_id=None, listen
     # not details instead options and correct_answers
     # would have to implement if the inserted question options and corrects exist in the question_data
     if question.type in ['multiple_to_multiple', 'insert_text', 'multiple_to_single', 'audio', 'prose_summary']:
-        if question.type == 'audio' and audio_file:
-            # Save the audio file
-            audio_url = save_file(audio_file, 'question_audios')
-
-            # Create QuestionAudio record
+        if question.type == 'audio' and audio_url:
+            # Create QuestionAudio record (the file was saved before the transaction began)
             question_audio = QuestionAudio(
                 question_id=question.id,
                 audio_url=audio_url
@@ -210,29 +274,21 @@ def create_question(question_data, section_type, reading_passage_id=None, listen
             if row and column:
                 db.session.add(CorrectAnswer(question=question, table_row=row, table_column=column))
 
-    db.session.commit()
+    db.session.flush()  # the caller commits the whole section at once
     return question
 
-# Before request handler
-@app.before_request
-def log_request_info():
-    print("=== Incoming Request ===")
-    print(f"Method: {request.method}")
-    print(f"URL: {request.url}")
-    print(f"Headers: {request.headers}")
-
-    # Handle different content types
-    if request.content_type:
-        if request.content_type.startswith('multipart/form-data'):
-            print(f"Form Data: {request.form.to_dict()}")
-            print(f"Files: {request.files.to_dict()}")
-        elif request.content_type == 'application/json':
-            print(f"JSON Body: {request.get_json(silent=True)}")
-        else:
-            print(f"Raw Body: {request.get_data(as_text=True)}")
-    else:
-        print("No body content")
-    print("=====================")
+# One structured log line per request, with sampled and redacted bodies
+request_logger = RequestLogger(app, sample_rate=app.config['REQUEST_LOG_SAMPLE_RATE'],
+                               max_body_chars=app.config['REQUEST_LOG_MAX_BODY'])
+
+# Per-route latency, SQL and size histograms, served at /metrics
+request_metrics = RequestMetrics(app)
+
+# Compress large JSON responses (registered last so it runs before the
+# logging and metrics hooks, which then see the compressed size)
+@app.after_request
+def compress_json_response(response):
+    return compress_response(response, request.accept_encodings, app.config['COMPRESS_MIN_SIZE'])
 
 # Registration endpoint
 @app.route('/register', methods=['POST'])
@@ -256,10 +312,15 @@ def register():
     if existing_user:
         print('username or email already exists')
         return jsonify({'error': 'Username or email already exists'}), 400
+    db.session.rollback()  # give the DB connection back to the pool while the hash runs
+
+    try:
+        password_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '5'}
 
     # Create new user with role 'student'
-    user = User(username=username, email=email, role='student')
-    user.set_password(password)
+    user = User(username=username, email=email, role='student', password_hash=password_hash)
     db.session.add(user)
     db.session.commit()
 
@@ -272,7 +333,7 @@ def register():
                 'username': user.username,
                 'email': user.email
             }
-        }),
+        }), 200
 
 # Login endpoint
 @app.route('/login', methods=['POST'])
@@ -290,8 +351,21 @@ def login():
         print('missing required fields')
         return jsonify({'error': 'Missing required fields'}), 400
 
-    user = User.query.filter_by(email=email).first()
-    if user and user.check_password(password):
+    user = db.session.query(User.id, User.username, User.email, User.role, User.password_hash)\
+        .filter_by(email=email).first()
+    if not user:
+        return jsonify({'error': 'Invalid credentials'}), 401
+    db.session.rollback()  # give the DB connection back to the pool while the hash runs
+    try:
+        matches, new_hash = password_hasher.verify(user.password_hash, password)
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '5'}
+
+    if matches:
+        if new_hash:
+            # Stored with an outdated PASSWORD_HASH_METHOD
+            User.query.filter_by(id=user.id).update({'password_hash': new_hash})
+            db.session.commit()
         token = generate_token(user)
         return jsonify({
             'token': token,
@@ -310,24 +384,21 @@ def logout():
     """Logout endpoint (client should discard token)."""
     return jsonify({'message': 'Logout successful'}), 200
 
-# Route to serve audio files
+# Route to serve audio files and photos (supports Range and conditional requests)
 @app.route('/files/<path:filename>')
 def get_file(filename):
+    base_dir = os.path.realpath(os.environ.get('BASE_DIR'))
     # Construct full path
-    file_path = os.path.join(os.environ.get('BASE_DIR'), filename)
+    file_path = os.path.realpath(os.path.join(base_dir, filename))
     # Security check: ensure path is within BASE_DIR
-    if not file_path.startswith(os.environ.get('BASE_DIR')):
+    if os.path.commonpath([base_dir, file_path]) != base_dir:
         abort(403, description="Access denied")
     
     # Check if file exists and is a file (not directory)
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
+    if not os.path.isfile(file_path):
         abort(404, description="File not found")
     
-    return send_file(
-        file_path,
-        mimetype='audio/mpeg',
-        as_attachment=False
-    )
+    return media_response(file_path, os.path.relpath(file_path, base_dir))
 
 
 # Readign section
@@ -375,32 +446,7 @@ def create_reading_section():
 
 @app.route('/reading/<int:section_id>', methods=['GET'])
 def get_reading_section(section_id):
-    section = Section.query.filter_by(id=section_id, section_type='reading').first()
-    if not section:
-        return jsonify({'error': 'Section not found'}), 404
-
-    passages = ReadingPassage.query.filter_by(section_id=section.id).all()
-    passages_data = []
-    for passage in passages:
-        questions = Question.query.filter_by(reading_passage_id=passage.id).all()
-        questions_data = []
-        for q in questions:
-            options = Option.query.filter_by(question_id=q.id).all()
-            # options_data = [{'id': o.id, 'option_text': o.option_text} for o in options]
-            options_data = [o.option_text for o in options]
-            questions_data.append({'id': q.id, 'type': q.type, 'prompt': q.prompt, 'options': options_data})
-        passages_data.append({
-            'id': passage.id,
-            'title': passage.title,
-            'text': passage.content,
-            'questions': questions_data
-        })
-
-    return jsonify({
-        'id': section.id,
-        'title': section.title,
-        'passages': passages_data
-    }), 200
+    return section_response('reading', section_id)
 
 @app.route('/reading/<int:section_id>', methods=['PUT'])
 @admin_required
@@ -414,6 +460,7 @@ def update_reading_section(section_id):
         return jsonify({'error': 'Missing JSON data'}), 400
 
     section.title = data.get('title', section.title)
+    section_cache.bump(section_id)
     db.session.commit()
 
     return jsonify({'message': 'Section updated successfully'}), 200
@@ -424,21 +471,17 @@ def delete_reading_section(section_id):
     section = Section.query.filter_by(id=section_id, section_type='reading').first()
     if not section:
         return jsonify({'error': 'Section not found'}), 404
+    if has_attempts(section_id):
+        return jsonify({'error': 'Section has student attempts and cannot be deleted'}), 409
 
+    section_cache.bump(section_id)
     db.session.delete(section)
     db.session.commit()
     return jsonify({'message': 'Section deleted successfully'}), 200
 
 @app.route('/readings', methods=['GET'])
 def get_reading_sections():
-    sections = Section.query.filter_by(section_type='reading').all()
-    if not sections:
-        return jsonify({'error': 'Section not found'}), 404
-
-    return jsonify({
-        'total': len(sections),
-        'sections': [{'id': section.id, 'title': section.title} for section in sections],
-    }), 200
+    return section_list_response(['reading'])
 
 # Assuming token_required decorator provides student_id
 @app.route('/reading/<int:section_id>/submit', methods=['POST'])
@@ -452,33 +495,23 @@ def submit_reading_answers(student_id, section_id):
         data = data['answers']
 
         # Step 1: Validate passages belong to the specified section
+        section_index = section_indexes.get(section_id, 'reading')
         passage_ids = [int(pid) for pid in data.keys()]  # Convert keys to integers
-        passages = db.session.query(ReadingPassage).filter(
-            ReadingPassage.id.in_(passage_ids),
-            ReadingPassage.section_id == section_id
-        ).all()
-
-        if len(passages) != len(passage_ids):
+        if not section_index or any(pid not in section_index.groups for pid in passage_ids):
             return jsonify({'error': 'One or more passage IDs are invalid or do not belong to section'}), 404
 
         # Step 2: Process and store user answers
+        submitted = {}  # question_id -> selected option ids, scored in step 3
+        answer_rows = []  # UserAnswer rows, written in one statement below
         for passage_id_str, questions in data.items():
             passage_id = int(passage_id_str)
             for question_id_str, user_answer_indices in questions.items():
                 question_id = int(question_id_str)
                 # Verify question belongs to the passage
-                question = db.session.query(Question).filter_by(
-                    id=question_id,
-                    reading_passage_id=passage_id
-                ).first()
+                question = section_index.question(passage_id, question_id)
                 if not question:
                     return jsonify({'error': f'Question ID {question_id} not in passage {passage_id}'}), 404
-
-                # Get options for the question, ordered by id
-                options = db.session.query(Option).filter_by(
-                    question_id=question_id
-                ).order_by(Option.id).all()
-                option_ids = [opt.id for opt in options]
+                option_ids = question.option_ids  # ordered by id, as in the payload
 
                 # Map user answer indices to option_ids
                 try:
@@ -496,68 +529,17 @@ def submit_reading_answers(student_id, section_id):
                 except ValueError:
                     return jsonify({'error': f'Invalid answer format for question {question_id}'}), 400
 
-                # Delete previous answers for this user and question
-                db.session.query(UserAnswer).filter_by(
-                    user_id=student_id,
-                    question_id=question_id
-                ).delete()
-
-                # Insert new user answers
-                for opt_id in selected_option_ids:
-                    user_answer = UserAnswer(
-                        user_id=student_id,
-                        question_id=question_id,
-                        option_id=opt_id
-                    )
-                    db.session.add(user_answer)
-
-        # Commit all changes to the database
-        db.session.commit()
+                submitted[question_id] = set(selected_option_ids)
+                answer_rows.extend(answer_row(student_id, question_id, option_id=opt_id)
+                                   for opt_id in selected_option_ids)
 
-        # Step 3: Calculate the section's score
-        total_score = 0
-        # Get all questions in the section via reading passages
-        questions = (
-            db.session.query(Question, db.func.count(CorrectAnswer.id).label('correct_count'))
-            .outerjoin(CorrectAnswer, Question.id == CorrectAnswer.question_id)
-            .join(ReadingPassage, Question.reading_passage_id == ReadingPassage.id)
-            .filter(ReadingPassage.section_id == section_id)
-            .group_by(Question.id)
-            .all()
-        )
-
-        for question, correct_count in questions:
-            # Determine points based on question type and number of correct answers
-            if question.type in ('prose_summary', 'table') and correct_count > 1:
-                points = 2  # Multiple-selection or table questions
-            else:
-                points = 1  # Default for other types (e.g., 'insert-a-text')
-
-            # Get correct answers
-            correct_option_ids = set(
-                ca.option_id for ca in db.session.query(CorrectAnswer)
-                .filter_by(question_id=question.id)
-                .all()
-            )
-
-            # Get user answers
-            user_option_ids = set(
-                ua.option_id for ua in db.session.query(UserAnswer)
-                .filter_by(question_id=question.id, user_id=student_id)
-                .all()
-            )
-
-            print('correct answers: ', correct_option_ids, '\nuser options: ', user_option_ids)
-
-            # how to calculate to 30
-            # total_score = (raw_score / max_possible_score) * 30
-
-            # Scoring: all-or-nothing
-            if user_option_ids == correct_option_ids and user_option_ids:
-                total_score += points
+        # Step 3: Calculate the section's score against the cached answer key
+        # and record the attempt with its answers and score
+        attempt, result = record_scored_attempt(student_id, section_id, 'reading', submitted, answer_rows)
 
         # Step 4: Return the section's score
-        return jsonify({'section_id': section_id, 'score': total_score})
+        return jsonify({'section_id': section_id, 'attempt_id': attempt.id, 'score': result.raw,
+                        'max_score': result.max_score, 'scaled_score': result.scaled})
 
     except Exception as e:
         db.session.rollback()  # Roll back on error
@@ -584,29 +566,36 @@ def create_listening_section():
     if not audios_data:
         return jsonify({'error': 'No audios provided'}), 400
 
-    section = Section(section_type='listening', title=title)
-    db.session.add(section)
-
+    # Validate and collect all media first: audio, photo, then one snippet slot per question
+    files = []
     for i, audio_data in enumerate(audios_data):
-        audio_title = audio_data.get('title')
-        if not audio_title:
+        if not audio_data.get('title'):
             return jsonify({'error': f'Missing title for audio {i}'}), 400
 
         audio_file = request.files.get(f'audioFiles[{i}]')
         if not audio_file:
             return jsonify({'error': f'Missing audio file for audio {i}'}), 400
 
-        photo_file = request.files.get(f'photoFiles[{i}]')
-        audio_url = save_file(audio_file, 'listening_audios')
-        photo_url = save_file(photo_file, 'listening_photos') if photo_file else None
+        files.append(audio_file)
+        files.append(request.files.get(f'photoFiles[{i}]'))
+        for indx, question_data in enumerate(audio_data.get('questions', [])):
+            question_audio = request.files.get(f'questionSnippetFiles[{i}][{indx}]')
+            files.append(question_audio if question_data.get('type') == 'audio' else None)
 
-        audio = ListeningAudio(title=audio_title, audio_url=audio_url, photo_url=photo_url, section=section)
+    # Save every file in parallel; the transaction only begins once they are all durable
+    urls = iter(save_files(files))
+
+    section = Section(section_type='listening', title=title)
+    db.session.add(section)
+
+    for audio_data in audios_data:
+        audio_url, photo_url = next(urls), next(urls)
+        audio = ListeningAudio(title=audio_data['title'], audio_url=audio_url, photo_url=photo_url, section=section)
         db.session.add(audio)
         db.session.flush() # to get the id to use in create_question
-        
-        for indx, question_data in enumerate(audio_data.get('questions', [])):
-            question_audio = request.files.get(f'questionSnippetFiles[{i}][{indx}]')
-            create_question(question_data, 'listening', listening_audio_id=audio.id, audio_file=question_audio)
+
+        for question_data in audio_data.get('questions', []):
+            create_question(question_data, 'listening', listening_audio_id=audio.id, audio_url=next(urls))
 
     db.session.commit()
     
@@ -619,43 +608,7 @@ def create_listening_section():
 
 @app.route('/listening/<int:section_id>', methods=['GET'])
 def get_listening_section(section_id):
-    section = Section.query.filter_by(id=section_id, section_type='listening').first()
-    if not section:
-        return jsonify({'error': 'Section not found'}), 404
-
-    audios = ListeningAudio.query.filter_by(section_id=section.id).all()
-    audios_data = []
-    for audio in audios:
-        questions = Question.query.filter_by(listening_audio_id=audio.id).all()
-        questions_data = []
-        for q in questions:
-            if q.type == 'table':
-                table_rows = TableQuestionRow.query.filter_by(question_id=q.id).all()
-                table_columns = TableQuestionColumn.query.filter_by(question_id=q.id).all()
-                rows = [row.row_label for row in table_rows]
-                columns = [col.column_label for col in table_columns]
-                questions_data.append({'id': q.id, 'type': q.type, 'prompt': q.prompt,  'rows': rows, 'columns': columns})
-            else:
-                options = Option.query.filter_by(question_id=q.id).all()
-                options_data = [o.option_text for o in options]
-                if q.type == 'audio':
-                    audio_url = QuestionAudio.query.filter_by(question_id=q.id).first()
-                    questions_data.append({'id': q.id, 'type': q.type, 'audio_url': audio_url.audio_url, 'prompt': q.prompt, 'options': options_data})
-                else:
-                    questions_data.append({'id': q.id, 'type': q.type, 'prompt': q.prompt, 'options': options_data})
-        audios_data.append({
-            'id': audio.id,
-            'title': audio.title,
-            'audio_url': audio.audio_url,
-            'photo_url': audio.photo_url,
-            'questions': questions_data
-        })
-
-    return jsonify({
-        'id': section.id,
-        'title': section.title,
-        'audios': audios_data
-    }), 200
+    return section_response('listening', section_id)
 
 @app.route('/listening/<int:section_id>', methods=['PUT'])
 @admin_required
@@ -669,6 +622,7 @@ def update_listening_section(section_id):
         return jsonify({'error': 'Missing JSON data'}), 400
 
     section.title = data.get('title', section.title)
+    section_cache.bump(section_id)
     db.session.commit()
 
     return jsonify({'message': 'Section updated successfully'}), 200
@@ -679,34 +633,18 @@ def delete_listening_section(section_id):
     section = Section.query.filter_by(id=section_id, section_type='listening').first()
     if not section:
         return jsonify({'error': 'Section not found'}), 404
+    if has_attempts(section_id):
+        return jsonify({'error': 'Section has student attempts and cannot be deleted'}), 409
 
-    audios = ListeningAudio.query.filter_by(section_id=section.id).all()
-    for audio in audios:
-        if audio.audio_url:
-            try:
-                os.remove(audio.audio_url.lstrip('/'))
-            except OSError:
-                pass
-        if audio.photo_url:
-            try:
-                os.remove(audio.photo_url.lstrip('/'))
-            except OSError:
-                pass
-
+    section_cache.bump(section_id)
     db.session.delete(section)
     db.session.commit()
+    media_gc.request_collection()  # audios and photos nobody references any more
     return jsonify({'message': 'Section deleted successfully'}), 200
 
 @app.route('/listenings', methods=['GET'])
 def get_listening_sections():
-    sections = Section.query.filter_by(section_type='listening').all()
-    if not sections:
-        return jsonify({'error': 'Section not found'}), 404
-
-    return jsonify({
-        'total': len(sections),
-        'sections': [{'id': section.id, 'title': section.title} for section in sections],
-    }), 200
+    return section_list_response(['listening'])
 
 
 @app.route('/listening/<int:section_id>/submit', methods=['POST'])
@@ -723,57 +661,34 @@ def submit_listening_answers(student_id, section_id):
             return jsonify({'error': 'Invalid answers format'}), 400
 
         # **Step 1: Validate Audio IDs**
+        section_index = section_indexes.get(section_id, 'listening')
         audio_ids = [int(audio_id) for audio_id in answers.keys()]
-        audios = db.session.query(ListeningAudio).filter(
-            ListeningAudio.id.in_(audio_ids),
-            ListeningAudio.section_id == section_id
-        ).all()
-        if len(audios) != len(audio_ids):
+        if not section_index or any(aid not in section_index.groups for aid in audio_ids):
             return jsonify({'error': 'One or more audio IDs are invalid or do not belong to this section'}), 404
 
         # **Step 2: Process and Store User Answers**
+        submitted = {}  # question_id -> selected option ids or (row_id, col_id) cells, scored in step 3
+        answer_rows = []  # UserAnswer rows, written in one statement below
         for audio_id_str, questions in answers.items():
             audio_id = int(audio_id_str)
             for question_id_str, user_answers in questions.items():
                 question_id = int(question_id_str)
                 # Verify the question belongs to the audio
-                question = db.session.query(Question).filter_by(
-                    id=question_id,
-                    listening_audio_id=audio_id
-                ).first()
+                question = section_index.question(audio_id, question_id)
                 if not question:
                     return jsonify({'error': f'Question ID {question_id} not found in audio {audio_id}'}), 404
 
-                # Fetch all options for the question
-                options = db.session.query(Option).filter_by(question_id=question_id).order_by(Option.id).all()
-                option_map = {chr(97 + i): opt.id for i, opt in enumerate(options)}  # 'a' -> option_id, 'b' -> option_id, etc.
-                # Delete previous answers for this user and question
-                db.session.query(UserAnswer).filter_by(
-                    user_id=student_id,
-                    question_id=question_id
-                ).delete()
-
                 if question.type == 'table':
-                    # Process table question answers
-                    for row_id_str, columns in user_answers.items():
-                        # implementing a translation but in the future it would be better just to pass the row ids from the front-end
-                        row_id = int(row_id_str)
-                        rows = TableQuestionRow.query.filter_by(question_id=question_id).all()
-                        row_id = rows[row_id].id
-                        for col_id_str, selected in columns.items():
-                            if selected:  # True indicates the cell is selected
-                                col_id = int(col_id_str)
-                                columns = TableQuestionColumn.query.filter_by(question_id=question_id).all()
-                                col_id = columns[col_id].id
-                                user_answer = UserAnswer(
-                                    user_id=student_id,
-                                    question_id=question_id,
-                                    table_row_id=row_id,
-                                    table_column_id=col_id
-                                )
-                                db.session.add(user_answer)
+                    # Cells by stable row/column ids or by position
+                    try:
+                        selected_cells = submitted[question_id] = table_cells(question, user_answers)
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        return jsonify({'error': f'Invalid table answer for question {question_id}'}), 400
+                    answer_rows.extend(answer_row(student_id, question_id, table_row_id=row_id, table_column_id=col_id)
+                                       for row_id, col_id in selected_cells)
                 else:
                     # Handle multiple-choice questions
+                    option_map = {chr(97 + i): option_id for i, option_id in enumerate(question.option_ids)}  # 'a' -> option_id, 'b' -> option_id, etc.
                     selected_option_ids = []
                     for answer in user_answers:
                         if isinstance(answer, str) and answer.lower() in option_map:
@@ -781,71 +696,21 @@ def submit_listening_answers(student_id, section_id):
                         else:
                             return jsonify({'error': f'Invalid option {answer} for question {question_id}'}), 400
 
-                    # Store the selected options
-                    for option_id in selected_option_ids:
-                        user_answer = UserAnswer(
-                            user_id=student_id,
-                            question_id=question_id,
-                            option_id=option_id
-                        )
-                        db.session.add(user_answer)
+                    submitted[question_id] = set(selected_option_ids)
+                    answer_rows.extend(answer_row(student_id, question_id, option_id=option_id)
+                                       for option_id in selected_option_ids)
 
-        # Commit all changes to the database
-        db.session.commit()
-
-        # **Step 3: Calculate the Score**
-        total_score = 0
-        questions = (
-            db.session.query(Question, db.func.count(CorrectAnswer.id).label('correct_count'))
-            .outerjoin(CorrectAnswer, Question.id == CorrectAnswer.question_id)
-            .join(ListeningAudio, Question.listening_audio_id == ListeningAudio.id)
-            .filter(ListeningAudio.section_id == section_id)
-            .group_by(Question.id)
-            .all()
-        )
-
-        for question, correct_count in questions:
-            # Assign points based on question type and number of correct answers
-            if question.type in ('prose_summary', 'table') and correct_count > 1:
-                points = 2  # For multiple-selection or table questions
-            else:
-                points = 1  # Default case
-
-            # Get correct and user answers
-            if question.type == 'table':
-                user_option_ids = set()
-                for ua in db.session.query(UserAnswer) \
-                        .filter_by(question_id=question.id, user_id=student_id) \
-                        .all():
-                    user_option_ids.add((ua.table_row_id, ua.table_column_id))
-
-                correct_option_ids = set()
-                for ca in db.session.query(CorrectAnswer) \
-                        .filter_by(question_id=question.id) \
-                        .all():
-                    correct_option_ids.add((ca.table_row_id, ca.table_column_id))
-            else:
-                user_option_ids = set(
-                    ua.option_id for ua in db.session.query(UserAnswer)
-                    .filter_by(question_id=question.id, user_id=student_id)
-                    .all()
-                )
-                correct_option_ids = set(
-                    ca.option_id for ca in db.session.query(CorrectAnswer)
-                    .filter_by(question_id=question.id)
-                    .all()
-                )
-
-            print('correct answers: ', correct_option_ids, '\nuser options: ', user_option_ids)
-
-            # All-or-nothing scoring
-            if user_option_ids == correct_option_ids and user_option_ids:
-                total_score += points
+        # **Step 3: Calculate the Score against the cached answer key**
+        # and record the attempt with its answers and score
+        attempt, result = record_scored_attempt(student_id, section_id, 'listening', submitted, answer_rows)
 
         # **Step 4: Return the Response**
         return jsonify({
             'section_id': section_id,
-            'score': total_score
+            'attempt_id': attempt.id,
+            'score': result.raw,
+            'max_score': result.max_score,
+            'scaled_score': result.scaled
         })
 
     except Exception as e:
@@ -873,6 +738,14 @@ def create_speaking_section():
     if not all(tasks.values()):
         return jsonify({'error': 'Missing one or more tasks'}), 400
 
+    # Tasks 2-4 come with audio; save them in parallel before the transaction begins
+    for num in (2, 3, 4):
+        if not request.files.get(f'task{num}Audio'):
+            return jsonify({'error': f'Missing task{num}Audio'}), 400
+    task2_url, task3_url, task4_url = save_files(
+        [request.files[f'task{num}Audio'] for num in (2, 3, 4)]
+    )
+
     section = Section(section_type='speaking', title=title)
     db.session.add(section)
 
@@ -880,30 +753,21 @@ def create_speaking_section():
     db.session.add(SpeakingTask(section=section, task_number=1, prompt=tasks['task1']['prompt']))
 
     # Task 2: passage, prompt, audio
-    task2_audio = request.files.get('task2Audio')
-    if not task2_audio:
-        return jsonify({'error': 'Missing task2Audio'}), 400
     db.session.add(SpeakingTask(
         section=section, task_number=2, passage=tasks['task2'].get('passage'), 
-        prompt=tasks['task2']['prompt'], audio_url=save_file(task2_audio, 'speaking_audios')
+        prompt=tasks['task2']['prompt'], audio_url=task2_url
     ))
 
     # Task 3: passage, prompt, audio
-    task3_audio = request.files.get('task3Audio')
-    if not task3_audio:
-        return jsonify({'error': 'Missing task3Audio'}), 400
     db.session.add(SpeakingTask(
         section=section, task_number=3, passage=tasks['task3'].get('passage'), 
-        prompt=tasks['task3']['prompt'], audio_url=save_file(task3_audio, 'speaking_audios')
+        prompt=tasks['task3']['prompt'], audio_url=task3_url
     ))
 
     # Task 4: prompt, audio
-    task4_audio = request.files.get('task4Audio')
-    if not task4_audio:
-        return jsonify({'error': 'Missing task4Audio'}), 400
     db.session.add(SpeakingTask(
         section=section, task_number=4, prompt=tasks['task4']['prompt'], 
-        audio_url=save_file(task4_audio, 'speaking_audios')
+        audio_url=task4_url
     ))
 
     db.session.commit()
@@ -917,22 +781,7 @@ def create_speaking_section():
 
 @app.route('/speaking/<int:section_id>', methods=['GET'])
 def get_speaking_section(section_id):
-    section = Section.query.filter_by(id=section_id, section_type='speaking').first()
-    if not section:
-        return jsonify({'error': 'Section not found'}), 404
-
-    tasks = SpeakingTask.query.filter_by(section_id=section.id).all()
-    tasks_data = [{'id': t.id, 'task_number': t.task_number, 'passage': t.passage, 
-                   'prompt': t.prompt, 'audio_url': t.audio_url} for t in tasks]
-
-    return jsonify({
-        'id': section.id,
-        'title': section.title,
-        'task1': tasks_data[0],
-        'task2': tasks_data[1],
-        'task3': tasks_data[2],
-        'task4': tasks_data[3]
-    }), 200
+    return section_response('speaking', section_id)
 
 @app.route('/speaking/<int:section_id>', methods=['PUT'])
 @admin_required
@@ -946,6 +795,7 @@ def update_speaking_section(section_id):
         return jsonify({'error': 'Missing JSON data'}), 400
 
     section.title = data.get('title', section.title)
+    section_cache.bump(section_id)
     db.session.commit()
 
     return jsonify({'message': 'Section updated successfully'}), 200
@@ -957,28 +807,16 @@ def delete_speaking_section(section_id):
     if not section:
         return jsonify({'error': 'Section not found'}), 404
 
-    tasks = SpeakingTask.query.filter_by(section_id=section.id).all()
-    for task in tasks:
-        if task.audio_url:
-            try:
-                os.remove(task.audio_url.lstrip('/'))
-            except OSError:
-                pass
-
+    GradingItem.query.filter_by(section_id=section_id).delete()
+    section_cache.bump(section_id)
     db.session.delete(section)
     db.session.commit()
+    media_gc.request_collection()  # task audios nobody references any more
     return jsonify({'message': 'Section deleted successfully'}), 200
 
 @app.route('/speakings', methods=['GET'])
 def get_speaking_sections():
-    sections = Section.query.filter_by(section_type='speaking').all()
-    if not sections:
-        return jsonify({'error': 'Section not found'}), 404
-
-    return jsonify({
-        'total': len(sections),
-        'sections': [{'id': section.id, 'title': section.title} for section in sections],
-    }), 200
+    return section_list_response(['speaking'])
 
 @app.route('/speaking/<int:section_id>/submit', methods=['POST'])
 @student_required
@@ -998,50 +836,53 @@ def submit_speaking_answers(student_id, section_id):
         if field_name not in request.files:
             return jsonify({'error': f'Missing {field_name}'}), 400
 
-    # Process each recording
+    # Find all tasks of the section at once
+    task_ids = {number: task_id for number, task_id in db.session.query(SpeakingTask.task_number, SpeakingTask.id)
+                .filter_by(section_id=section_id)}
     for num in task_numbers:
-        # Find the corresponding task
-        task = db.session.query(SpeakingTask).filter_by(section_id=section_id, task_number=num).first()
-        if not task:
+        if num not in task_ids:
             return jsonify({'error': f'Speaking task {num} not found for this section'}), 404
-
-        # Get the uploaded file
-        file = request.files[f'task{num}Recording']
-        if file.filename == '':
+        if request.files[f'task{num}Recording'].filename == '':
             return jsonify({'error': f'No selected file for task {num}'}), 400
-        
-        # Delete previous response audios for this user and task
-        prev_response = SpeakingResponse.query.filter_by(task_id=task.id, user_id=student_id).first()
+
+    # Save the recordings in parallel; the write transaction only begins once they are durable
+    db.session.rollback()  # end the lookups' read transaction; no connection is held during the uploads
+    audio_urls = save_files([request.files[f'task{num}Recording'] for num in task_numbers])
+
+    responses = []
+    for num, audio_url in zip(task_numbers, audio_urls):
+        task_id = task_ids[num]
+
+        # Replace the previous response for this user and task; its recording is left to the media GC
+        prev_response = SpeakingResponse.query.filter_by(task_id=task_id, user_id=student_id).first()
         if prev_response:
-            os.remove(prev_response.audio_url.lstrip('/'))
+            # Its score goes with it (SQLite does not enforce ON DELETE CASCADE)
+            Score.query.filter_by(speaking_response_id=prev_response.id).delete()
             db.session.delete(prev_response)
 
-        # Save the file and get its URL/path
-        audio_url = save_file(file, 'speaking_responses')
-
         # Store the response in the database
         response = SpeakingResponse(
             user_id=student_id,
-            task_id=task.id,
-            audio_url=audio_url
+            task_id=task_id,
+            audio_url=audio_url,
+            media_status='pending'
         )
         db.session.add(response)
+        responses.append(response)
+    grading_queue.enqueue(section_id, 'speaking', student_id)
 
     # Commit all changes
     db.session.commit()
+    speaking_media.submit([response.id for response in responses])  # transcode off the request path
+    media_gc.request_collection()
     return jsonify({'message': 'Speaking answers submitted successfully'}), 200
 
 @app.route('/speaking/<int:section_id>/review/<int:student_id>', methods=['GET'])
 @token_required
 def review_speaking_section(user_id, student_id, section_id):
     try:
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        s_id = student_id
-        if user.role == 'student':
-            s_id = user.id
+        # Students may only review their own responses
+        s_id = user_id if g.role == 'student' else student_id
 
         # Verify the section exists and is a speaking section
         section = Section.query.filter_by(id=section_id, section_type='speaking').first()
@@ -1050,7 +891,7 @@ def review_speaking_section(user_id, student_id, section_id):
         
         responses = db.session.query(SpeakingResponse, Score)\
         .join(SpeakingResponse.task)\
-        .outerjoin(Score, Score.response_id == SpeakingResponse.id)\
+        .outerjoin(Score, Score.speaking_response_id == SpeakingResponse.id)\
         .filter(
             SpeakingResponse.user_id == s_id,
             SpeakingTask.section_id == section_id
@@ -1072,6 +913,8 @@ def review_speaking_section(user_id, student_id, section_id):
                 'task_id': response.task_id,
                 'task_number': response.task.task_number,
                 'audio_url': response.audio_url,
+                'media_status': response.media_status,
+                'duration_seconds': response.duration_seconds,
                 'score': float(score.score) if score and score.score is not None else None,
                 'feedback': score.feedback if score and score.feedback is not None else None
             }
@@ -1097,8 +940,7 @@ def submit_speaking_review(current_user_id, section_id):
             return jsonify({'error': 'Speaking section not found'}), 404
 
         # Check if the user is authorized (teacher or admin)
-        reviewer = db.session.query(User).filter_by(id=current_user_id).first()
-        if reviewer.role not in ['teacher', 'admin']:
+        if g.role not in ['teacher', 'admin']:
             return jsonify({'error': 'Unauthorized to submit reviews'}), 403
 
         # Get the JSON data from the request
@@ -1116,6 +958,7 @@ def submit_speaking_review(current_user_id, section_id):
             return jsonify({'error': 'Must submit reviews for all speaking tasks in the section'}), 400
 
         # Process each review
+        student_ids = set()
         for item in data:
             response_id = item.get('response_id')
             task_id = item.get('task_id')
@@ -1136,12 +979,10 @@ def submit_speaking_review(current_user_id, section_id):
             response = SpeakingResponse.query.get(response_id)
             if not response:
                 return jsonify({'error': f'No speaking response found for task {task_id}'}), 404
+            student_ids.add(response.user_id)
 
             # Update or create the review
-            existing_score = db.session.query(Score).filter_by(
-                response_id=response.id,
-                response_type='speaking'
-            ).first()
+            existing_score = db.session.query(Score).filter_by(speaking_response_id=response.id).first()
             if existing_score:
                 existing_score.score = score_value
                 existing_score.feedback = feedback
@@ -1150,12 +991,19 @@ def submit_speaking_review(current_user_id, section_id):
                 new_score = Score(
                     response_id=response.id,
                     response_type='speaking',
+                    speaking_response_id=response.id,
                     score=score_value,
                     feedback=feedback,
                     scored_by=current_user_id
                 )
                 db.session.add(new_score)
 
+        # Another reviewer claimed this submission from the grading queue
+        if any(grading_queue.held_by_other(section_id, s, current_user_id) for s in student_ids):
+            db.session.rollback()
+            return jsonify({'error': 'Submission is being reviewed by another reviewer'}), 409
+        grading_queue.mark_graded(section_id, student_ids)
+
         # Save all changes
         db.session.commit()
         return jsonify({'message': 'Speaking reviews submitted successfully'}), 200
@@ -1187,16 +1035,19 @@ def create_writing_section():
     if not all(tasks.values()):
         return jsonify({'error': 'Missing one or more tasks'}), 400
 
+    # Save the task 1 audio before the transaction begins
+    task1_audio = request.files.get('task1Audio')
+    if not task1_audio:
+        return jsonify({'error': 'Missing task1Audio'}), 400
+    task1_url = save_file(task1_audio)
+
     section = Section(section_type='writing', title=title)
     db.session.add(section)
 
     # Task 1: passage, prompt, audio
-    task1_audio = request.files.get('task1Audio')
-    if not task1_audio:
-        return jsonify({'error': 'Missing task1Audio'}), 400
     db.session.add(WritingTask(
         section=section, task_number=1, passage=tasks['task1']['passage'], 
-        prompt=tasks['task1']['prompt'], audio_url=save_file(task1_audio, 'writing_audios')
+        prompt=tasks['task1']['prompt'], audio_url=task1_url
     ))
 
     # Task 2: passage, prompt
@@ -1216,20 +1067,7 @@ def create_writing_section():
 
 @app.route('/writing/<int:section_id>', methods=['GET'])
 def get_writing_section(section_id):
-    section = Section.query.filter_by(id=section_id, section_type='writing').first()
-    if not section:
-        return jsonify({'error': 'Section not found'}), 404
-
-    tasks = WritingTask.query.filter_by(section_id=section.id).all()
-    tasks_data = [{'id': t.id, 'task_number': t.task_number, 'passage': t.passage, 
-                   'prompt': t.prompt, 'audio_url': t.audio_url} for t in tasks]
-
-    return jsonify({
-        'id': section.id,
-        'title': section.title,
-        'task1': tasks_data[0],
-        'task2': tasks_data[1]
-    }), 200
+    return section_response('writing', section_id)
 
 @app.route('/writing/<int:section_id>', methods=['PUT'])
 @admin_required
@@ -1243,6 +1081,7 @@ def update_writing_section(section_id):
         return jsonify({'error': 'Missing JSON data'}), 400
 
     section.title = data.get('title', section.title)
+    section_cache.bump(section_id)
     db.session.commit()
 
     return jsonify({'message': 'Section updated successfully'}), 200
@@ -1254,28 +1093,16 @@ def delete_writing_section(section_id):
     if not section:
         return jsonify({'error': 'Section not found'}), 404
 
-    tasks = WritingTask.query.filter_by(section_id=section.id).all()
-    for task in tasks:
-        if task.audio_url:
-            try:
-                os.remove(task.audio_url.lstrip('/'))
-            except OSError:
-                pass
-
+    GradingItem.query.filter_by(section_id=section_id).delete()
+    section_cache.bump(section_id)
     db.session.delete(section)
     db.session.commit()
+    media_gc.request_collection()  # task audios nobody references any more
     return jsonify({'message': 'Section deleted successfully'}), 200
 
 @app.route('/writings', methods=['GET'])
 def get_writing_sections():
-    sections = Section.query.filter_by(section_type='writing').all()
-    if not sections:
-        return jsonify({'error': 'Section not found'}), 404
-
-    return jsonify({
-        'total': len(sections),
-        'sections': [{'id': section.id, 'title': section.title} for section in sections],
-    }), 200
+    return section_list_response(['writing'])
 
 @app.route('/writing/<int:section_id>/submit', methods=['POST'])
 @student_required
@@ -1325,6 +1152,7 @@ def submit_writing_answers(student_id, section_id):
                     word_count=word_count
                 )
                 db.session.add(new_response)
+        grading_queue.enqueue(section_id, 'writing', student_id)
         db.session.commit()
         return jsonify({'message': 'Writing answers submitted successfully'}), 200
 
@@ -1336,13 +1164,8 @@ def submit_writing_answers(student_id, section_id):
 @token_required
 def review_writing_section(user_id, section_id, student_id):
     try:
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        s_id = student_id
-        if user.role == 'student':
-            s_id = user.id
+        # Students may only review their own responses
+        s_id = user_id if g.role == 'student' else student_id
 
         if not section_id or not s_id:
             return jsonify({'error': 'Missing section_id or student_id'}), 400
@@ -1350,7 +1173,7 @@ def review_writing_section(user_id, section_id, student_id):
         # Fetch responses with tasks and scores
         responses = db.session.query(WritingResponse, WritingTask, Score)\
             .join(WritingTask, WritingResponse.task_id == WritingTask.id)\
-            .outerjoin(Score, (Score.response_id == WritingResponse.id) & (Score.response_type == 'writing'))\
+            .outerjoin(Score, Score.writing_response_id == WritingResponse.id)\
             .filter(
                 WritingResponse.user_id == s_id,
                 WritingTask.section_id == section_id
@@ -1400,6 +1223,7 @@ def submit_writing_review(current_user_id, section_id):
         if not section:
             return jsonify({'error': 'Writing section not found'}), 404
 
+        student_ids = set()
         for review in data:
             response_id = review.get('response_id')
             score_value = review.get('score')
@@ -1413,13 +1237,14 @@ def submit_writing_review(current_user_id, section_id):
             response = WritingResponse.query.get(response_id)
             if not response:
                 return jsonify({'error': f'Response ID {response_id} not found'}), 404
+            student_ids.add(response.user_id)
 
             # Validate score (assuming 0-100 range)
             if not isinstance(score_value, (int, float)) or score_value < 0 or score_value > 100:
                 return jsonify({'error': f'Invalid score {score_value} for response_id {response_id}'}), 400
 
             # Update or create score
-            existing_score = Score.query.filter_by(response_id=response_id, response_type='writing').first()
+            existing_score = Score.query.filter_by(writing_response_id=response_id).first()
             if existing_score:
                 existing_score.score = score_value
                 existing_score.feedback = feedback
@@ -1428,12 +1253,19 @@ def submit_writing_review(current_user_id, section_id):
                 new_score = Score(
                     response_id=response_id,
                     response_type='writing',
+                    writing_response_id=response_id,
                     score=score_value,
                     feedback=feedback,
                     scored_by=current_user_id
                 )
                 db.session.add(new_score)
 
+        # Another reviewer claimed this submission from the grading queue
+        if any(grading_queue.held_by_other(section_id, s, current_user_id) for s in student_ids):
+            db.session.rollback()
+            return jsonify({'error': 'Submission is being reviewed by another reviewer'}), 409
+        grading_queue.mark_graded(section_id, student_ids)
+
         db.session.commit()
         return jsonify({'message': 'Reviews submitted successfully'}), 200
 
@@ -1441,9 +1273,302 @@ def submit_writing_review(current_user_id, section_id):
         db.session.rollback()
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-# Create database tables
-with app.app_context():
-    db.create_all()
+# Tests: one section of each type, served as a single bundle
+
+@app.route('/tests', methods=['POST'])
+@admin_required_with_id
+def create_test(admin_id):
+    """
+    Expects JSON: {"title": ..., "reading_id": ..., "listening_id": ...,
+                   "speaking_id": ..., "writing_id": ...}
+    """
+    data = request.get_json(silent=True) or {}
+    section_ids = {t: data.get(f'{t}_id') for t in SECTION_TYPES}
+    if not data.get('title') or not all(isinstance(i, int) for i in section_ids.values()):
+        return jsonify({'error': 'title and an id for every section type are required'}), 400
+
+    found = dict(db.session.query(Section.id, Section.section_type)
+                 .filter(Section.id.in_(section_ids.values())).all())
+    for section_type, section_id in section_ids.items():
+        if found.get(section_id) != section_type:
+            return jsonify({'error': f'{section_type.capitalize()} section {section_id} not found'}), 404
+
+    test = Test(title=data['title'], created_by=admin_id,
+                **{f'{t}_section_id': i for t, i in section_ids.items()})
+    db.session.add(test)
+    db.session.commit()
+    return jsonify({'id': test.id, 'title': test.title, 'sections': test.section_ids()}), 201
+
+@app.route('/tests/<int:test_id>', methods=['DELETE'])
+@admin_required
+def delete_test(test_id):
+    test = db.session.get(Test, test_id)
+    if not test:
+        return jsonify({'error': 'Test not found'}), 404
+    db.session.delete(test)
+    db.session.commit()
+    test_bundles.discard(test_id)
+    return jsonify({'message': 'Test deleted successfully'}), 200
+
+@app.route('/tests/<int:test_id>/bundle', methods=['GET'])
+def get_test_bundle(test_id):
+    """
+    All four section payloads of a test plus the media they reference:
+    {"id", "title", "sections": {"reading": {...}, ...}, "media": [{"url", "section"}]}
+    Compressed (br or gzip) when the client accepts it.
+    """
+    test = db.session.get(Test, test_id)
+    if not test:
+        return jsonify({'error': 'Test not found'}), 404
+    bundle = test_bundles.get(test)
+    if not bundle:
+        return jsonify({'error': 'One of the test sections no longer exists'}), 409
+
+    response = send_encoded(app.response_class(mimetype='application/json'), bundle,
+                            request.accept_encodings, app.config['COMPRESS_MIN_SIZE'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# Answer key corrections and re-scoring
+
+@app.route('/questions/<int:question_id>/correct-answers', methods=['PUT'])
+@admin_required_with_id
+def update_correct_answers(admin_id, question_id):
+    """
+    Replace a question's correct answers and re-score the section in the
+    background. Same fields as when creating the question:
+    {"correct_answer": "text"}, {"correct_answers": ["text", ...]} or, for
+    table questions, {"correct_selections": [{"row": "label", "column": "label"}]}
+    Returns 202 with the re-scoring job.
+    """
+    question = db.session.get(Question, question_id)
+    if not question:
+        return jsonify({'error': 'Question not found'}), 404
+    data = request.get_json(silent=True) or {}
+    group = question.reading_passage or question.listening_audio
+    section_id = group.section_id
+
+    new_answers = []
+    if question.type == 'table':
+        rows = {row.row_label: row for row in question.table_rows}
+        columns = {column.column_label: column for column in question.table_columns}
+        for selection in data.get('correct_selections') or []:
+            row, column = rows.get(selection.get('row')), columns.get(selection.get('column'))
+            if not row or not column:
+                return jsonify({'error': f'Unknown cell {selection}'}), 400
+            new_answers.append(CorrectAnswer(question_id=question.id, table_row_id=row.id, table_column_id=column.id))
+    else:
+        options = {option.option_text: option for option in question.options}
+        corrects = data.get('correct_answers') or ([data['correct_answer']] if data.get('correct_answer') else [])
+        for text in corrects:
+            if text not in options:
+                return jsonify({'error': f'Unknown option {text}'}), 400
+            new_answers.append(CorrectAnswer(question_id=question.id, option_id=options[text].id))
+    if not new_answers:
+        return jsonify({'error': 'At least one correct answer is required'}), 400
+
+    CorrectAnswer.query.filter_by(question_id=question.id).delete(synchronize_session=False)
+    db.session.add_all(new_answers)
+    section_cache.bump(section_id)  # also moves the answer key index to the new key
+    db.session.commit()
+
+    job = rescore_runner.start(section_id, created_by=admin_id)
+    return jsonify(job_payload(job)), 202
+
+@app.route('/sections/<int:section_id>/rescore', methods=['POST'])
+@admin_required_with_id
+def rescore_section(admin_id, section_id):
+    """Re-score every stored attempt of a reading or listening section
+    against its current answer key, in the background. Returns 202 with the job."""
+    section = db.session.get(Section, section_id)
+    if not section or section.section_type not in ('reading', 'listening'):
+        return jsonify({'error': 'Reading or listening section not found'}), 404
+
+    section_cache.bump(section_id)  # every attempt now predates the key; committed with the job
+    job = rescore_runner.start(section_id, created_by=admin_id)
+    return jsonify(job_payload(job)), 202
+
+@app.route('/rescore-jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def get_rescore_job(job_id):
+    """Progress of a re-scoring job: status, total and done attempts."""
+    job = db.session.get(RescoreJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_payload(job)), 200
+
+@app.route('/reviews/bulk', methods=['POST'])
+@admin_required_with_id
+def submit_bulk_reviews(reviewer_id):
+    """
+    Expects JSON: {"reviews": [{"type": "speaking" | "writing", "response_id": 1,
+                                "score": 8, "feedback": "..."}, ...]}
+    Reviews may span students and sections. Valid items are saved even when
+    others fail; the response lists one result per item, in order.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('reviews')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'reviews must be a non-empty list'}), 400
+    if len(items) > MAX_BULK_REVIEWS:
+        return jsonify({'error': f'At most {MAX_BULK_REVIEWS} reviews per request'}), 400
+
+    try:
+        results = bulk_review(items, reviewer_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    saved = sum(1 for result in results if result['status'] == 'saved')
+    return jsonify({'saved': saved, 'failed': len(results) - saved, 'results': results}), 200
+
+# Grading queue: reviewers pull speaking/writing submissions to score
+
+@app.route('/grading/queue', methods=['GET'])
+@admin_required
+def get_grading_queue():
+    """Open items per section type: {"speaking": {"pending": n, "claimed": n}, ...}"""
+    return jsonify(grading_queue.queue_counts()), 200
+
+@app.route('/grading/claim', methods=['POST'])
+@admin_required_with_id
+def claim_grading_item(reviewer_id):
+    """
+    Expects JSON: {"type": "speaking" | "writing", "section_id": optional}
+    Claims the oldest open submission for GRADING_LEASE_SECONDS; 204 when
+    there is nothing to review.
+    """
+    data = request.get_json(silent=True) or {}
+    section_type, section_id = data.get('type'), data.get('section_id')
+    if section_type not in ('speaking', 'writing'):
+        return jsonify({'error': 'type must be speaking or writing'}), 400
+    if section_id is not None and not isinstance(section_id, int):
+        return jsonify({'error': 'section_id must be an integer'}), 400
+
+    item = grading_queue.claim_next(section_type, reviewer_id, app.config['GRADING_LEASE_SECONDS'], section_id)
+    if not item:
+        return '', 204
+    return jsonify(grading_queue.item_payload(item)), 200
+
+@app.route('/grading/<int:item_id>/renew', methods=['POST'])
+@admin_required_with_id
+def renew_grading_item(reviewer_id, item_id):
+    if not grading_queue.renew(item_id, reviewer_id, app.config['GRADING_LEASE_SECONDS']):
+        return jsonify({'error': 'Lease lost: the item was graded or claimed by another reviewer'}), 409
+    return jsonify(grading_queue.item_payload(db.session.get(GradingItem, item_id))), 200
+
+@app.route('/grading/<int:item_id>/release', methods=['POST'])
+@admin_required_with_id
+def release_grading_item(reviewer_id, item_id):
+    if not grading_queue.release(item_id, reviewer_id):
+        return jsonify({'error': 'Item is not claimed by you'}), 409
+    return jsonify({'message': 'Item returned to the queue'}), 200
+
+# Section lists
+
+@app.route('/sections', methods=['GET'])
+def get_sections():
+    """
+    List sections of every type, or of ?type=reading,listening,... only,
+    with the same paging parameters as /readings.
+    """
+    types = request.args.get('type')
+    section_types = types.split(',') if types else list(SECTION_TYPES)
+    if not set(section_types) <= set(SECTION_TYPES):
+        return jsonify({'error': f"type must be among {', '.join(SECTION_TYPES)}"}), 400
+    return section_list_response(section_types)
+
+# Attempt history
+
+@app.route('/attempts', methods=['GET'])
+@token_required
+def get_attempts(user_id):
+    """
+    List reading/listening attempts, newest first.
+    Students only see their own; admins may filter by user_id.
+    Query params: user_id, section_id, section_type, before (attempt id), limit (max 200).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        before = request.args.get('before', type=int)
+        filter_user_id = user_id if g.role == 'student' else request.args.get('user_id', type=int)
+        section_id = request.args.get('section_id', type=int)
+    except ValueError:
+        return jsonify({'error': 'Invalid query parameters'}), 400
+
+    query = db.session.query(Attempt, User.username, Section.title)\
+        .join(User, Attempt.user_id == User.id)\
+        .join(Section, Attempt.section_id == Section.id)
+    if filter_user_id:
+        query = query.filter(Attempt.user_id == filter_user_id)
+    if section_id:
+        query = query.filter(Attempt.section_id == section_id)
+    if request.args.get('section_type'):
+        query = query.filter(Attempt.section_type == request.args['section_type'])
+    if before:
+        query = query.filter(Attempt.id < before)
+    rows = query.order_by(Attempt.id.desc()).limit(limit).all()
+
+    return jsonify({
+        'attempts': [{
+            'id': attempt.id,
+            'user_id': attempt.user_id,
+            'username': username,
+            'section_id': attempt.section_id,
+            'section_type': attempt.section_type,
+            'section_title': title,
+            'score': attempt.score,
+            'max_score': attempt.max_score,
+            'scaled_score': scale(attempt.score, attempt.max_score) if attempt.score is not None else None,
+            'created_at': attempt.created_at.isoformat() if attempt.created_at else None
+        } for attempt, username, title in rows],
+        'next_before': rows[-1][0].id if len(rows) == limit else None
+    }), 200
+
+@app.route('/results/export', methods=['GET'])
+@admin_required
+def export_results():
+    """
+    Stream every student's result per section as CSV or NDJSON.
+    Query params: format (csv, default, or ndjson), test_id, section_id, section_type.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    section_type = request.args.get('section_type')
+    if section_type and section_type not in SECTION_TYPES:
+        return jsonify({'error': 'Invalid section_type'}), 400
+    test_id = request.args.get('test_id', type=int)
+    section_id = request.args.get('section_id', type=int)
+
+    section_ids = None
+    if test_id:
+        test = db.session.get(Test, test_id)
+        if not test:
+            return jsonify({'error': 'Test not found'}), 404
+        section_ids = [i for i in test.section_ids().values() if i is not None]
+    if section_id:
+        section_ids = [i for i in section_ids if i == section_id] if section_ids is not None else [section_id]
+
+    filters = {'section_ids': section_ids, 'section_type': section_type}
+    response = Response(stream_with_context(export_chunks(export_format, filters)),
+                        mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=results.{export_format}'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass chunks through as they are written
+    return response
+
+# Create database tables and upgrade existing ones. When this file is run
+# as a script, the spawned re-scoring processes import it again as
+# __mp_main__; they must not repeat the startup.
+if __name__ != '__mp_main__':
+    with app.app_context():
+        upgrade_schema()
+        speaking_media.resume_pending()
+        rescore_runner.resume_stale()
+
+    if app.config['MEDIA_GC_INTERVAL'] > 0:
+        media_gc.start()
 
 # Run the application
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import jwt
+from flask import current_app, g, jsonify, request
+
+
+# Token authentication
+#
+# Tokens are HS256 JWTs carrying user_id, role and exp (see
+# generate_token in app.py). A verified token's claims are cached under the
+# SHA-256 of the token until its exp, so a client that sends the same token
+# on every request pays for one signature check. The claims are put on g
+# (g.user_id, g.role) for handlers that need the caller's role.
+
+class AuthError(Exception):
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class ClaimsCache:
+    """LRU of verified claims keyed by token digest; entries expire at the
+    token's exp."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires = entry
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, key, claims, expires):
+        with self._lock:
+            self._entries[key] = (claims, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+claims_cache = ClaimsCache()
+
+
+def bearer_token():
+    header = request.headers.get('Authorization')
+    if not header:
+        return None
+    parts = header.split(' ')
+    return parts[1] if len(parts) > 1 else ''  # Expecting 'Bearer <token>'
+
+
+def verify_token(token):
+    """Return the claims of a valid token; raises AuthError otherwise."""
+    key = hashlib.sha256(token.encode()).digest()
+    claims = claims_cache.get(key)
+    if claims is not None:
+        return claims
+
+    try:
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        claims = {'user_id': payload['user_id'], 'role': payload.get('role')}
+    except jwt.ExpiredSignatureError:
+        raise AuthError('Token expired')
+    except (jwt.InvalidTokenError, KeyError):
+        raise AuthError('Invalid token')
+
+    # Tokens without exp never expire in PyJWT; keep those for an hour at most
+    claims_cache.put(key, claims, payload.get('exp', time.time() + 3600))
+    return claims
+
+
+def authenticate(role=None, missing_message='Token is missing'):
+    """Verify the request's token (and role) and expose its claims on g."""
+    token = bearer_token()
+    if not token:
+        raise AuthError(missing_message)
+    claims = verify_token(token)
+    if role and claims['role'] != role:
+        raise AuthError(f'{role.capitalize()} privileges required', 403)
+    g.user_id = claims['user_id']
+    g.role = claims['role']
+    return claims
+
+
+def _guard(role=None, pass_user_id=False, missing_message='Token is missing'):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                claims = authenticate(role, missing_message)
+            except AuthError as e:
+                return jsonify({'error': e.message}), e.status
+            if pass_user_id:
+                return f(claims['user_id'], *args, **kwargs)
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+admin_required = _guard(role='admin', missing_message='Missing token')
+admin_required_with_id = _guard(role='admin', pass_user_id=True, missing_message='Missing token')
+student_required = _guard(role='student', pass_user_id=True)
+token_required = _guard(pass_user_id=True)
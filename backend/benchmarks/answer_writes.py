@@ -0,0 +1,73 @@
+"""Rows/sec of UserAnswer writes under concurrent submissions.
+
+Compares the former per-question path (DELETE per question plus one ORM
+add per selected option) with the append-only answer_store.record_attempt. Uses a
+temporary SQLite file unless BENCH_DATABASE_URI points elsewhere.
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import make_app, seed_reading_section
+from models import db, User, Question, ReadingPassage, UserAnswer
+from answer_store import answer_row, record_attempt
+
+STUDENTS = 16
+SUBMISSIONS_PER_STUDENT = 5
+
+
+def per_question_write(user_id, section_id, answers):
+    for question_id, option_ids in answers.items():
+        db.session.query(UserAnswer).filter_by(user_id=user_id, question_id=question_id).delete()
+        for option_id in option_ids:
+            db.session.add(UserAnswer(user_id=user_id, question_id=question_id, option_id=option_id))
+    db.session.commit()
+
+
+def attempt_write(user_id, section_id, answers):
+    rows = [answer_row(user_id, question_id, option_id=option_id)
+            for question_id, option_ids in answers.items() for option_id in option_ids]
+    record_attempt(user_id, section_id, 'reading', rows, 0, len(answers))
+    db.session.commit()
+
+
+def run(app, write, user_ids, section_id, answers):
+    def student(user_id):
+        with app.app_context():
+            for _ in range(SUBMISSIONS_PER_STUDENT):
+                write(user_id, section_id, answers)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(user_ids)) as pool:
+        list(pool.map(student, user_ids))
+    elapsed = time.perf_counter() - start
+    rows = len(user_ids) * SUBMISSIONS_PER_STUDENT * sum(len(v) for v in answers.values())
+    return rows / elapsed, elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = os.environ.get('BENCH_DATABASE_URI') or f'sqlite:///{os.path.join(tmp, "bench.db")}'
+        app = make_app(uri)
+        with app.app_context():
+            section_id = seed_reading_section(3, 10)
+            questions = (Question.query.join(ReadingPassage, Question.reading_passage_id == ReadingPassage.id)
+                         .filter(ReadingPassage.section_id == section_id).all())
+            # Two selections per question, like a prose summary
+            answers = {q.id: [o.id for o in q.options[:2]] for q in questions}
+            users = [User(username=f'student{i}', email=f'student{i}@example.com', password_hash='x', role='student')
+                     for i in range(STUDENTS)]
+            db.session.add_all(users)
+            db.session.commit()
+            user_ids = [u.id for u in users]
+
+        print(f'{STUDENTS} concurrent students x {SUBMISSIONS_PER_STUDENT} submissions, '
+              f'{sum(len(v) for v in answers.values())} rows per submission')
+        for label, write in (('per-question ORM', per_question_write), ('attempt append', attempt_write)):
+            rate, elapsed = run(app, write, user_ids, section_id, answers)
+            print(f'{label:<18}{rate:>12.0f} rows/s{elapsed:>10.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Per-request auth overhead: previous decorators vs auth.py.
+
+The previous path decoded and verified the JWT on every request and the
+review/attempt handlers then loaded the User row to read its role. The
+new path verifies a token once, caches its claims until exp and takes the
+role from g.
+"""
+import datetime
+from functools import wraps
+
+import jwt
+from flask import g, jsonify, request
+
+from benchmarks.common import make_app, timed
+from auth import claims_cache, token_required
+from models import db, User
+
+REQUESTS = 5000
+SECRET = 'bench-secret'
+
+
+def legacy_token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'error': 'Token is missing'}), 401
+        try:
+            token = token.split(" ")[1]
+            payload = jwt.decode(token, SECRET, algorithms=['HS256'])
+            user_id = payload['user_id']
+        except Exception:
+            return jsonify({'error': 'Invalid token'}), 401
+        return f(user_id, *args, **kwargs)
+    return decorated
+
+
+@legacy_token_required
+def legacy_view(user_id):
+    user = User.query.get(user_id)
+    return user.role
+
+
+@token_required
+def cached_view(user_id):
+    return g.role
+
+
+def run(app, view, headers, label, results):
+    with app.test_request_context('/', headers=headers):
+        view()
+        with timed(label, results):
+            for _ in range(REQUESTS):
+                view()
+        db.session.remove()
+
+
+def main():
+    app = make_app()
+    app.config['SECRET_KEY'] = SECRET
+    with app.app_context():
+        user = User(username='stu', email='stu@example.com', password_hash='x', role='student')
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode({'user_id': user.id, 'role': user.role,
+                            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+                           SECRET, algorithm='HS256')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    results = {}
+    run(app, legacy_view, headers, 'decode + User lookup', results)
+    run(app, cached_view, headers, 'cached claims', results)
+    claims_cache.clear()
+    print(f'{REQUESTS} authenticated requests')
+    for label, elapsed in results.items():
+        print(f'{label:<22}{elapsed * 1e6 / REQUESTS:>8.1f} us/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Grading a whole class: per-student review requests vs one bulk request.
+
+Seeds a writing section answered by STUDENTS students, then scores every
+response twice: the way submit_writing_review does it (one request per
+student, a response and a score lookup per item) and through
+reviews.bulk_review (one preload, one INSERT ... ON CONFLICT).
+"""
+from benchmarks.common import QueryCounter, make_app, timed
+from models import db, Section, User, WritingTask, WritingResponse, Score
+from reviews import bulk_review
+
+STUDENTS = 300
+
+
+def seed_class():
+    section = Section(section_type='writing', title='Class essay')
+    tasks = [WritingTask(section=section, task_number=n, passage='P', prompt='Q') for n in (1, 2)]
+    db.session.add_all([section] + tasks)
+    grader = User(username='grader', email='grader@example.com', password_hash='-', role='admin')
+    db.session.add(grader)
+    for s in range(STUDENTS):
+        student = User(username=f's{s}', email=f's{s}@example.com', password_hash='-', role='student')
+        db.session.add(student)
+        db.session.add_all([WritingResponse(user=student, task=task, response_text='essay ' * 300) for task in tasks])
+    db.session.commit()
+    return grader.id, [r for r, in db.session.query(WritingResponse.id).order_by(WritingResponse.id)]
+
+
+def per_student(grader_id, response_ids, score):
+    for i in range(0, len(response_ids), 2):  # one request per student
+        for response_id in response_ids[i:i + 2]:
+            response = db.session.get(WritingResponse, response_id)
+            existing = Score.query.filter_by(writing_response_id=response.id).first()
+            if existing:
+                existing.score, existing.feedback, existing.scored_by = score, 'ok', grader_id
+            else:
+                db.session.add(Score(response_id=response.id, response_type='writing',
+                                     writing_response_id=response.id, score=score, feedback='ok',
+                                     scored_by=grader_id))
+        db.session.commit()
+        db.session.expunge_all()
+
+
+def bulk(grader_id, response_ids, score):
+    bulk_review([{'type': 'writing', 'response_id': r, 'score': score, 'feedback': 'ok'}
+                 for r in response_ids], grader_id)
+    db.session.commit()
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        grader_id, response_ids = seed_class()
+        print(f'{len(response_ids)} responses from {STUDENTS} students')
+        for label, fn in (('per-student requests', per_student), ('bulk request', bulk)):
+            for attempt, score in (('insert', 50), ('update', 60)):
+                if attempt == 'insert':
+                    Score.query.delete()
+                    db.session.commit()
+                results = {}
+                with QueryCounter(db.engine) as counter, timed(label, results):
+                    fn(grader_id, response_ids, score)
+                print(f'{label:<22}{attempt:<8}{counter.count:>6} statements{results[label] * 1000:>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run against a standalone Flask app bound to the models, so they
+do not need the environment that app.py expects. Run them from the backend
+directory, e.g. ``python -m benchmarks.section_payload_queries``.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+from sqlalchemy import event
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from models import db, Section, ReadingPassage, ListeningAudio, Question, Option, \
+                   TableQuestionRow, TableQuestionColumn, QuestionAudio, CorrectAnswer
+
+
+def make_app(database_uri=None):
+    """Create an app with an empty schema (in-memory SQLite by default)."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri or os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+class QueryCounter:
+    """Count SQL statements executed on the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@contextmanager
+def timed(label, results):
+    start = time.perf_counter()
+    yield
+    results[label] = time.perf_counter() - start
+
+
+def seed_reading_section(passages, questions_per_passage, options_per_question=4):
+    """Insert a reading section and return its id."""
+    section = Section(section_type='reading', title=f'Reading {passages}x{questions_per_passage}')
+    db.session.add(section)
+    for p in range(passages):
+        passage = ReadingPassage(section=section, title=f'Passage {p}', content='Lorem ipsum ' * 400)
+        db.session.add(passage)
+        for q in range(questions_per_passage):
+            question = Question(section_type='reading', type='multiple_to_single',
+                                prompt=f'Question {q}', reading_passage=passage)
+            options = [Option(question=question, option_text=f'Option {o}') for o in range(options_per_question)]
+            db.session.add_all([question] + options)
+            db.session.add(CorrectAnswer(question=question, option=options[0]))
+    db.session.commit()
+    return section.id
+
+
+def seed_listening_section(audios, questions_per_audio):
+    """Insert a listening section mixing choice, audio and table questions."""
+    section = Section(section_type='listening', title=f'Listening {audios}x{questions_per_audio}')
+    db.session.add(section)
+    for a in range(audios):
+        audio = ListeningAudio(section=section, title=f'Audio {a}', audio_url=f'/uploads/listening_audios/{a}.mp3')
+        db.session.add(audio)
+        for q in range(questions_per_audio):
+            kind = ('multiple_to_single', 'audio', 'table')[q % 3]
+            question = Question(section_type='listening', type=kind, prompt=f'Question {q}', listening_audio=audio)
+            db.session.add(question)
+            if kind == 'table':
+                rows = [TableQuestionRow(question=question, row_label=f'Row {r}') for r in range(5)]
+                columns = [TableQuestionColumn(question=question, column_label=f'Col {c}') for c in range(3)]
+                db.session.add_all(rows + columns)
+                for r, row in enumerate(rows):
+                    db.session.add(CorrectAnswer(question=question, table_row=row, table_column=columns[r % 3]))
+            else:
+                options = [Option(question=question, option_text=f'Option {o}') for o in range(4)]
+                db.session.add_all(options)
+                db.session.add(CorrectAnswer(question=question, option=options[0]))
+                if kind == 'audio':
+                    db.session.add(QuestionAudio(question=question, audio_url=f'/uploads/question_audios/{a}-{q}.mp3'))
+    db.session.commit()
+    return section.id
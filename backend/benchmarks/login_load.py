@@ -0,0 +1,130 @@
+"""Login burst load test: inline hashing vs the PasswordHasher pool.
+
+Serves /login and GET /reading/<id> from a threaded werkzeug server in a
+subprocess, then runs LOGIN_CLIENTS clients logging in back to back next
+to READ_CLIENTS clients fetching a reading section, for DURATION seconds.
+Reports p50/p99 latency of both and the reading throughput.
+"""
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from flask import jsonify, request
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from benchmarks.common import BACKEND_DIR, make_app, seed_reading_section
+from models import db, User
+from passwords import PasswordHasher
+from section_payloads import build_reading_payload
+
+METHOD = 'scrypt:16384:8:1'
+HASH_WORKERS = 1
+LOGIN_CLIENTS = 24
+READ_CLIENTS = 4
+DURATION = 10
+
+
+def serve(mode, port, database):
+    app = make_app(f'sqlite:///{database}')
+    hasher = PasswordHasher(method=METHOD, max_workers=HASH_WORKERS)
+
+    @app.route('/login', methods=['POST'])
+    def login():
+        data = request.get_json()
+        user = db.session.query(User.password_hash).filter_by(email=data['email']).first()
+        db.session.rollback()
+        if mode == 'pool':
+            matches, _ = hasher.verify(user.password_hash, data['password'])
+        else:
+            matches = check_password_hash(user.password_hash, data['password'])
+        return jsonify({'ok': matches}), 200 if matches else 401
+
+    @app.route('/reading/<int:section_id>')
+    def reading(section_id):
+        return jsonify(build_reading_payload(section_id))
+
+    from werkzeug.serving import make_server
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def seed(database):
+    app = make_app(f'sqlite:///{database}')
+    with app.app_context():
+        section_id = seed_reading_section(3, 10)
+        db.session.add(User(username='stu', email='stu@example.com', role='student',
+                            password_hash=generate_password_hash('secret', METHOD)))
+        db.session.commit()
+    return section_id
+
+
+def wait_for(port):
+    for _ in range(100):
+        try:
+            http.client.HTTPConnection('127.0.0.1', port, timeout=1).connect()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def client(port, method, path, body, deadline, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': 'application/json'}
+    while time.time() < deadline:
+        started = time.perf_counter()
+        conn.request(method, path, body=body, headers=headers)
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def percentile(values, pct):
+    return statistics.quantiles(values, n=100)[pct - 1] * 1000 if len(values) > 1 else float('nan')
+
+
+def run_mode(mode, port, database, section_id):
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.login_load', 'serve', mode, str(port), database],
+                              cwd=BACKEND_DIR, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port)
+        logins, reads = [], []
+        deadline = time.time() + DURATION
+        body = json.dumps({'email': 'stu@example.com', 'password': 'secret'})
+        threads = [threading.Thread(target=client, args=(port, 'POST', '/login', body, deadline, logins))
+                   for _ in range(LOGIN_CLIENTS)]
+        threads += [threading.Thread(target=client, args=(port, 'GET', f'/reading/{section_id}', None, deadline, reads))
+                    for _ in range(READ_CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f'{mode:<8}login p50 {percentile(logins, 50):7.0f} ms  p99 {percentile(logins, 99):7.0f} ms  '
+          f'| reading p50 {percentile(reads, 50):6.1f} ms  p99 {percentile(reads, 99):6.1f} ms  '
+          f'{len(reads) / DURATION:6.0f} req/s')
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        section_id = seed(database)
+        print(f'{LOGIN_CLIENTS} login clients + {READ_CLIENTS} reading clients for {DURATION}s, '
+              f'{METHOD}, {os.cpu_count()} CPUs, pool of {HASH_WORKERS}')
+        for port, mode in enumerate(('inline', 'pool'), start=18400):
+            run_mode(mode, port, database, section_id)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    else:
+        main()
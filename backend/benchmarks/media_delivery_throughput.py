@@ -0,0 +1,145 @@
+"""Throughput of /files media delivery per MEDIA_DELIVERY mode.
+
+Starts gunicorn (sync workers, whose wsgi.file_wrapper uses os.sendfile)
+serving media_response for a 16 MB file, then has concurrent clients mix
+full downloads with 1 MB seeks. Reports MB/s and the CPU time the workers
+spent. The proxy modes (x-accel, x-sendfile) are measured without a proxy:
+their numbers are the cost of authorizing a request, the bytes would be
+sent by nginx/Apache.
+
+Needs gunicorn (``pip install gunicorn``); Linux only because worker CPU
+time is read from /proc.
+"""
+import http.client
+import importlib.util
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FILE_SIZE = 16 * 1024 * 1024
+RANGE_SIZE = 1024 * 1024
+CLIENTS = 8
+REQUESTS_PER_CLIENT = 40
+WORKERS = 2
+MODES = ('app', 'sendfile', 'x-accel')
+
+
+def create_app():
+    """gunicorn entry point: serve BENCH_MEDIA_FILE at /media."""
+    from flask import Flask
+    from media_delivery import media_response
+
+    path = os.environ['BENCH_MEDIA_FILE']
+    app = Flask(__name__)
+    app.config['MEDIA_DELIVERY'] = os.environ['MEDIA_DELIVERY']
+    app.config['MEDIA_ACCEL_PREFIX'] = '/protected-files'
+
+    @app.route('/media')
+    def media():
+        return media_response(path, os.path.basename(path))
+
+    return app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start')
+
+
+def worker_cpu_seconds(master_pid):
+    """utime + stime of the direct children of ``master_pid``."""
+    ticks = 0
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == master_pid:
+            ticks += int(fields[11]) + int(fields[12])
+    return ticks / os.sysconf('SC_CLK_TCK')
+
+
+def client(port, seed, totals, lock):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    received = 0
+    for i in range(REQUESTS_PER_CLIENT):
+        headers = {}
+        if i % 2:
+            start = rng.randrange(0, FILE_SIZE - RANGE_SIZE)
+            headers['Range'] = f'bytes={start}-{start + RANGE_SIZE - 1}'
+        conn.request('GET', '/media', headers=headers)
+        response = conn.getresponse()
+        while chunk := response.read(256 * 1024):
+            received += len(chunk)
+    conn.close()
+    with lock:
+        totals.append(received)
+
+
+def run_mode(mode, media_file):
+    port = free_port()
+    env = dict(os.environ, BENCH_MEDIA_FILE=media_file, MEDIA_DELIVERY=mode)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(WORKERS), '-b', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'benchmarks.media_delivery_throughput:create_app()'],
+        cwd=BACKEND_DIR, env=env)
+    try:
+        wait_for(port)
+        cpu_before = worker_cpu_seconds(server.pid)
+        totals, lock = [], threading.Lock()
+        threads = [threading.Thread(target=client, args=(port, seed, totals, lock)) for seed in range(CLIENTS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        cpu = worker_cpu_seconds(server.pid) - cpu_before
+    finally:
+        server.terminate()
+        server.wait()
+
+    requests = CLIENTS * REQUESTS_PER_CLIENT
+    print(f'{mode:<10}{requests / elapsed:>10.0f} req/s{sum(totals) / elapsed / 2**20:>10.0f} MB/s'
+          f'{cpu * 1000 / requests:>10.2f} ms worker CPU/request')
+
+
+def main():
+    if importlib.util.find_spec('gunicorn') is None:
+        sys.exit('gunicorn is required: pip install gunicorn')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        media_file = os.path.join(tmp, 'lecture.mp3')
+        with open(media_file, 'wb') as f:
+            f.write(os.urandom(FILE_SIZE))
+
+        print(f'{CLIENTS} clients x {REQUESTS_PER_CLIENT} requests (full {FILE_SIZE // 2**20} MB / '
+              f'{RANGE_SIZE // 2**20} MB range), {WORKERS} sync workers')
+        for mode in MODES:
+            run_mode(mode, media_file)
+
+
+if __name__ == '__main__':
+    main()
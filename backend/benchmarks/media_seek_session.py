@@ -0,0 +1,99 @@
+"""Bytes transferred for a seek-heavy listening session.
+
+A student opens a 6 MB lecture, seeks 12 times (the player fetches a
+512 KB window after each seek), then re-opens the lecture 3 times. The
+client keeps an HTTP cache: it skips requests while a response is fresh
+(max-age) and revalidates with If-None-Match otherwise.
+
+Three handlers are compared: one that ignores Range and validators, the
+previous /files handler (Flask's default conditional send_file with
+mimetype audio/mpeg), and media_response.
+"""
+import os
+import random
+import tempfile
+
+from flask import Flask, send_file
+
+from media_delivery import media_response
+
+FILE_SIZE = 6 * 1024 * 1024
+WINDOW = 512 * 1024
+SEEKS = 12
+REOPENS = 3
+
+
+def make_media_app(base_dir, path):
+    app = Flask(__name__)
+    app.config['MEDIA_DELIVERY'] = 'app'
+
+    @app.route('/whole')
+    def whole():
+        return send_file(path, mimetype='audio/mpeg', conditional=False, etag=False)
+
+    @app.route('/previous')
+    def previous():
+        return send_file(path, mimetype='audio/mpeg', as_attachment=False)
+
+    @app.route('/media')
+    def media():
+        return media_response(path, os.path.relpath(path, base_dir))
+
+    return app
+
+
+class CachingClient:
+    def __init__(self, client):
+        self.client = client
+        self.cached = None  # (etag, fresh)
+        self.transferred = 0
+        self.requests = 0
+
+    def get(self, url, headers=None):
+        headers = dict(headers or {})
+        if self.cached and 'Range' not in headers:
+            etag, fresh = self.cached
+            if fresh:
+                return
+            if etag:
+                headers['If-None-Match'] = etag
+        r = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.transferred += len(r.data)
+        if r.status_code in (200, 206):
+            self.cached = (r.headers.get('ETag'), (r.cache_control.max_age or 0) > 0)
+
+
+def session(client, url):
+    browser = CachingClient(client)
+    browser.get(url, {'Range': f'bytes=0-{WINDOW - 1}'})
+    browser.get(url)  # full download for playback
+
+    rng = random.Random(42)
+    for _ in range(SEEKS):
+        start = rng.randrange(0, FILE_SIZE - WINDOW)
+        browser.get(url, {'Range': f'bytes={start}-{start + WINDOW - 1}'})
+
+    for _ in range(REOPENS):
+        browser.get(url)
+    return browser.transferred, browser.requests
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        digest = 'ab' * 32
+        path = os.path.join(tmp, 'blobs', digest[:2], digest[2:4], f'{digest}.mp3')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(os.urandom(FILE_SIZE))
+
+        client = make_media_app(tmp, path).test_client()
+        print(f'{SEEKS} seeks and {REOPENS} re-opens of a {FILE_SIZE // 1024 // 1024} MB lecture')
+        for label, url in (('no ranges/validators', '/whole'), ('previous /files', '/previous'),
+                           ('media_response', '/media')):
+            transferred, requests = session(client, url)
+            print(f'{label:<22}{requests:>4} requests{transferred / 1024 / 1024:>10.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Query-plan regression check for the hot lookups.
+
+Runs EXPLAIN on every lookup below and fails if any of them scans a table
+instead of using an index (or, on SQLite, sorts instead of reading an
+index in order). Uses in-memory SQLite by default; point
+BENCH_DATABASE_URI at PostgreSQL to check it too (sequential scans are
+disabled for the session there, so a plan only falls back to one when no
+usable index exists).
+
+    python -m benchmarks.query_plans
+"""
+import sys
+
+import datetime
+
+from sqlalchemy import select, text, tuple_
+
+from benchmarks.common import make_app
+from models import db, Section, Question, Option, CorrectAnswer, UserAnswer, \
+                   SpeakingResponse, WritingResponse, Score, ListeningAudio, ReadingPassage, \
+                   TableQuestionRow, TableQuestionColumn, QuestionAudio, SpeakingTask, WritingTask, GradingItem
+from grading_queue import claimable
+
+HOT_LOOKUPS = {
+    'sections by type': select(Section).where(Section.section_type == 'reading'),
+    'section page after cursor': select(Section).where(
+        Section.section_type == 'reading',
+        tuple_(Section.created_at, Section.id) > (datetime.datetime(2025, 1, 1), 1)
+    ).order_by(Section.created_at, Section.id).limit(100),
+    'all sections page after cursor': select(Section).where(
+        tuple_(Section.created_at, Section.id) > (datetime.datetime(2025, 1, 1), 1)
+    ).order_by(Section.created_at, Section.id).limit(100),
+    'passages by section': select(ReadingPassage).where(ReadingPassage.section_id == 1),
+    'audios by section': select(ListeningAudio).where(ListeningAudio.section_id == 1),
+    'speaking tasks by section': select(SpeakingTask).where(SpeakingTask.section_id == 1),
+    'writing tasks by section': select(WritingTask).where(WritingTask.section_id == 1),
+    'questions by passage': select(Question).where(Question.reading_passage_id == 1),
+    'questions by audio': select(Question).where(Question.listening_audio_id == 1),
+    'options by question': select(Option).where(Option.question_id == 1),
+    'table rows by question': select(TableQuestionRow).where(TableQuestionRow.question_id == 1),
+    'table columns by question': select(TableQuestionColumn).where(TableQuestionColumn.question_id == 1),
+    'question audios by question': select(QuestionAudio).where(QuestionAudio.question_id == 1),
+    'correct answers by question': select(CorrectAnswer).where(CorrectAnswer.question_id == 1),
+    'user answers by user and question': select(UserAnswer).where(UserAnswer.user_id == 1, UserAnswer.question_id == 1),
+    'speaking response by task and user': select(SpeakingResponse).where(SpeakingResponse.task_id == 1, SpeakingResponse.user_id == 1),
+    'writing response by task and user': select(WritingResponse).where(WritingResponse.task_id == 1, WritingResponse.user_id == 1),
+    'score by speaking response': select(Score).where(Score.speaking_response_id == 1),
+    'score by writing response': select(Score).where(Score.writing_response_id == 1),
+    'grading queue claim': select(GradingItem.id).where(
+        GradingItem.section_type == 'speaking', claimable(datetime.datetime(2025, 1, 1))
+    ).order_by(GradingItem.submitted_at, GradingItem.id).limit(1),
+    'grading item by section and user': select(GradingItem).where(GradingItem.section_id == 1, GradingItem.user_id == 1),
+}
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN' if conn.dialect.name == 'sqlite' else 'EXPLAIN'
+    rows = conn.execute(text(f'{prefix} {compiled}')).all()
+    return [row[-1] for row in rows]
+
+
+def uses_index(dialect, plan):
+    if dialect == 'sqlite':
+        # 'SEARCH t USING INDEX ...' is an index lookup, 'SCAN t' a full scan;
+        # a temp B-tree means the rows are sorted instead of read in order
+        return all(not line.startswith(('SCAN', 'USE TEMP B-TREE')) for line in plan)
+    return not any('Seq Scan' in line for line in plan)
+
+
+def check_plans(conn):
+    """Yield (name, plan, uses_index) for every hot lookup."""
+    dialect = conn.dialect.name
+    if dialect == 'postgresql':
+        conn.execute(text('SET enable_seqscan = off'))
+    for name, statement in HOT_LOOKUPS.items():
+        plan = explain(conn, statement)
+        yield name, plan, uses_index(dialect, plan)
+
+
+def main():
+    app = make_app()
+    failures = []
+    with app.app_context(), db.engine.connect() as conn:
+        dialect = conn.dialect.name
+        for name, plan, ok in check_plans(conn):
+            print(f'{"ok" if ok else "SCAN":<6}{name:<40}{" | ".join(plan)}')
+            if not ok:
+                failures.append(name)
+
+    if failures:
+        print(f'{len(failures)} lookups do not use an index on {dialect}: {", ".join(failures)}')
+        sys.exit(1)
+    print(f'all {len(HOT_LOOKUPS)} hot lookups use an index on {dialect}')
+
+
+if __name__ == '__main__':
+    main()
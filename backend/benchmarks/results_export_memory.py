@@ -0,0 +1,67 @@
+"""Peak memory of the result export as the cohort grows.
+
+Seeds reading attempts and writing responses for COHORTS students, then
+consumes the streamed CSV export (results_export.export_chunks) and, for
+comparison, builds the same rows from one .all() query. Peak Python
+allocations are measured with tracemalloc; the streamed export should stay
+flat while the materialized list grows with the cohort.
+"""
+import tracemalloc
+
+from sqlalchemy import insert
+
+from benchmarks.common import make_app
+from models import db, Attempt, Section, User, WritingTask, WritingResponse
+from results_export import objective_query, export_chunks
+
+COHORTS = (2000, 8000, 32000)
+
+
+def seed(students):
+    db.drop_all()
+    db.create_all()
+    reading = Section(section_type='reading', title='Reading')
+    writing = Section(section_type='writing', title='Writing')
+    tasks = [WritingTask(section=writing, task_number=n, passage='P', prompt='Q') for n in (1, 2)]
+    db.session.add_all([reading, writing] + tasks)
+    db.session.commit()
+    db.session.execute(insert(User), [
+        {'id': s + 1, 'username': f's{s}', 'email': f's{s}@example.com', 'password_hash': '-', 'role': 'student'}
+        for s in range(students)])
+    db.session.execute(insert(Attempt), [
+        {'user_id': s + 1, 'section_id': reading.id, 'section_type': 'reading', 'score': s % 10, 'max_score': 10}
+        for s in range(students)])
+    db.session.execute(insert(WritingResponse), [
+        {'user_id': s + 1, 'task_id': task.id, 'response_text': 'essay', 'word_count': 1}
+        for s in range(students) for task in tasks])
+    db.session.commit()
+
+
+def peak_kib(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def streamed():
+    for _ in export_chunks('csv', {'section_ids': None, 'section_type': None}):
+        pass
+
+
+def materialized():
+    db.session.execute(objective_query({})).all()
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        print(f'{"students":>9}{"streamed export":>18}{"reading rows .all()":>22}')
+        for students in COHORTS:
+            seed(students)
+            print(f'{students:>9}{peak_kib(streamed):>14.0f} KiB{peak_kib(materialized):>18.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Bytes and CPU per request for compressed section payloads.
+
+Renders a reading section with three ~700-word passages, then compares
+sending it uncompressed, compressing it on every request (the
+after_request path) and serving the variant cached with the payload.
+"""
+import random
+import time
+
+from benchmarks.common import make_app
+from compression import DYNAMIC_LEVELS, available_encodings, compress
+from models import db, Section, ReadingPassage, Question, Option
+from section_cache import CachedSection
+from section_payloads import build_reading_payload
+
+REQUESTS = 200
+WORDS = ('the of and to in is that for it as was with be by on not he this are or his from at which but '
+         'have an they you were her she there been one all we their has would when if so no will more '
+         'about up out who them some could what into than time only its new these may other two people '
+         'river climate species fossil settlers glacier pottery migration sediment colony tribe ancient '
+         'evidence researchers theory population agriculture temperature ecosystem trade volcanic').split()
+
+
+def seed_long_reading(rng):
+    section = Section(section_type='reading', title='Long reading')
+    db.session.add(section)
+    for p in range(3):
+        text = ' '.join(rng.choice(WORDS) for _ in range(700))
+        passage = ReadingPassage(section=section, title=f'Passage {p}', content=text)
+        for q in range(10):
+            question = Question(section_type='reading', type='multiple_to_single',
+                                prompt=' '.join(rng.choice(WORDS) for _ in range(25)), reading_passage=passage)
+            db.session.add_all([question] + [Option(question=question, option_text=' '.join(
+                rng.choice(WORDS) for _ in range(8))) for _ in range(4)])
+    db.session.commit()
+    return section.id
+
+
+def cpu_per_request(fn):
+    started = time.process_time()
+    for _ in range(REQUESTS):
+        fn()
+    return (time.process_time() - started) * 1e6 / REQUESTS
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        section_id = seed_long_reading(random.Random(7))
+        body = app.json.dumps(build_reading_payload(section_id)).encode('utf-8')
+
+    entry = CachedSection(body)
+    print(f'reading payload, {REQUESTS} requests per row')
+    print(f'{"identity":<20}{len(body):>9} bytes')
+    for encoding in available_encodings():
+        dynamic = cpu_per_request(lambda: compress(body, encoding, DYNAMIC_LEVELS[encoding]))
+        entry.variant(encoding)  # first request compresses once
+        cached = cpu_per_request(lambda: entry.variant(encoding))
+        print(f'{encoding + " per request":<20}{len(compress(body, encoding, DYNAMIC_LEVELS[encoding])):>9} bytes'
+              f'{dynamic:>10.0f} us CPU')
+        print(f'{encoding + " cached":<20}{len(entry.variant(encoding)):>9} bytes{cached:>10.1f} us CPU')
+
+
+if __name__ == '__main__':
+    main()
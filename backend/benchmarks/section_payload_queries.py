@@ -0,0 +1,44 @@
+"""Query count and latency of the section payload builders.
+
+The number of statements per payload must stay constant as sections grow:
+4 for reading (section, passages, questions, options) and 7 for listening
+(section, audios, questions, options, rows, columns, question audios).
+"""
+import time
+
+from benchmarks.common import make_app, QueryCounter, seed_reading_section, seed_listening_section
+from models import db
+from section_payloads import build_reading_payload, build_listening_payload
+
+SIZES = [(1, 3), (3, 10), (3, 30), (6, 50)]
+
+
+def measure(build, section_id):
+    db.session.expire_all()
+    with QueryCounter(db.engine) as counter:
+        start = time.perf_counter()
+        build(section_id)
+        elapsed = time.perf_counter() - start
+    return counter.count, elapsed
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        print(f'{"section":<10}{"groups x questions":>20}{"queries":>10}{"ms":>10}')
+        counts = {}
+        for kind, seed, build in (('reading', seed_reading_section, build_reading_payload),
+                                  ('listening', seed_listening_section, build_listening_payload)):
+            for groups, questions in SIZES:
+                section_id = seed(groups, questions)
+                count, elapsed = measure(build, section_id)
+                counts.setdefault(kind, set()).add(count)
+                print(f'{kind:<10}{f"{groups} x {questions}":>20}{count:>10}{elapsed * 1000:>10.2f}')
+
+        for kind, seen in counts.items():
+            assert len(seen) == 1, f'{kind} query count grows with section size: {sorted(seen)}'
+        print('query count is constant for every section size')
+
+
+if __name__ == '__main__':
+    main()
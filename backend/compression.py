@@ -0,0 +1,87 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+
+# Response compression
+#
+# JSON responses above COMPRESS_MIN_SIZE are sent with the best encoding
+# the client accepts (br, then gzip). Cached bodies (section payloads, test
+# bundles) derive from CompressedVariants and compress each encoding once,
+# at the highest level, on first use; other responses are compressed per
+# request at a cheaper level. Variants are built without a lock (a br-11
+# pass can take a while and must not stall other entries); racing first
+# requests may both compress, and the first result published is kept.
+
+CACHED_LEVELS = {'br': 11, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': 5, 'gzip': 6}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def negotiate(accept_encodings):
+    """Pick the encoding for a request's Accept-Encoding, or None."""
+    for encoding in available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class CompressedVariants:
+    """Mixin for cached entries with a ``body``: compressed copies of the
+    body are built once per encoding and kept with the entry."""
+
+    def variant(self, encoding):
+        variants = self.__dict__.setdefault('_variants', {})
+        data = variants.get(encoding)
+        if data is None:
+            data = variants.setdefault(encoding, compress(self.body, encoding, CACHED_LEVELS[encoding]))
+        return data
+
+
+def send_encoded(response, entry, accept_encodings, min_size):
+    """Fill ``response`` with ``entry`` (body + etag), precompressed when
+    the client accepts it. The ETag names the encoding so caches never mix
+    representations."""
+    encoding = negotiate(accept_encodings) if len(entry.body) >= min_size else None
+    if encoding:
+        response.set_data(entry.variant(encoding))
+        response.content_encoding = encoding
+        response.set_etag(f'{entry.etag}-{encoding}')
+    else:
+        response.set_data(entry.body)
+        response.set_etag(entry.etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response, accept_encodings, min_size):
+    """after_request hook body: compress a plain JSON response in place."""
+    if (response.direct_passthrough or response.content_encoding
+            or response.mimetype != 'application/json' or response.status_code not in (200, 201)):
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    encoding = negotiate(accept_encodings)
+    if not encoding:
+        return response
+
+    response.set_data(compress(body, encoding, DYNAMIC_LEVELS[encoding]))
+    response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
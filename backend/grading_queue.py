@@ -0,0 +1,145 @@
+import datetime
+
+from sqlalchemy import and_, func, or_, tuple_, update
+
+from models import db, GradingItem
+
+LEASE_SECONDS = 900
+
+
+# Grading queue for speaking and writing reviews
+#
+# Every speaking/writing submission puts one GradingItem per (section,
+# student) in the queue, or back into it when the student resubmits.
+# Items are served in submitted_at order, and a resubmission moves its item
+# to the back of the queue. Reviewers claim the oldest open item for a
+# lease; scoring the responses marks it done, and a lease that runs out
+# makes the item claimable again, so work abandoned by a reviewer is
+# picked up by the next one.
+#
+# A claim is a single compare-and-set UPDATE that picks the oldest open
+# item in a subquery and re-checks that it is still claimable, so two
+# reviewers can never hold the same item: whoever's UPDATE matched no row
+# did not get it. On PostgreSQL the subquery locks the row with FOR UPDATE
+# SKIP LOCKED, letting concurrent claims pass each other instead of
+# queueing on the same row; SQLite runs the whole statement under its
+# writer lock.
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def claimable(now):
+    # status IN (...) keeps the query on the ix_grading_items_open_queue partial index
+    return and_(
+        GradingItem.status.in_(('pending', 'claimed')),
+        or_(GradingItem.status == 'pending', GradingItem.lease_expires_at < now)
+    )
+
+
+def enqueue(section_id, section_type, user_id):
+    """(Re)queue a student's submission for review. Runs inside the
+    caller's transaction; the caller commits."""
+    item = GradingItem.query.filter_by(section_id=section_id, user_id=user_id).first()
+    if item is None:
+        item = GradingItem(section_id=section_id, section_type=section_type, user_id=user_id)
+        db.session.add(item)
+    item.status, item.claimed_by, item.lease_expires_at = 'pending', None, None
+    item.submitted_at, item.graded_at = _utcnow(), None
+    return item
+
+
+def claim_next(section_type, reviewer_id, lease_seconds=LEASE_SECONDS, section_id=None):
+    """Claim the oldest open item of a section type (optionally of one
+    section) and commit. Returns the item, or None when the queue is empty."""
+    now = _utcnow()
+    oldest = db.session.query(GradingItem.id)\
+        .filter(GradingItem.section_type == section_type, claimable(now))
+    if section_id is not None:
+        oldest = oldest.filter(GradingItem.section_id == section_id)
+    oldest = oldest.order_by(GradingItem.submitted_at, GradingItem.id).limit(1)
+    if db.engine.dialect.name == 'postgresql':
+        oldest = oldest.with_for_update(skip_locked=True)
+
+    expires = now + datetime.timedelta(seconds=lease_seconds)
+    claimed = db.session.execute(
+        update(GradingItem)
+        .where(GradingItem.id == oldest.scalar_subquery(), claimable(now))
+        .values(status='claimed', claimed_by=reviewer_id, lease_expires_at=expires)
+        .returning(GradingItem.id),
+        execution_options={'synchronize_session': False}
+    ).scalar()
+    db.session.commit()
+    return db.session.get(GradingItem, claimed) if claimed is not None else None
+
+
+def renew(item_id, reviewer_id, lease_seconds=LEASE_SECONDS):
+    """Extend a lease the reviewer still holds and commit. Returns False when
+    the lease was lost (expired and reclaimed, or the item was graded)."""
+    expires = _utcnow() + datetime.timedelta(seconds=lease_seconds)
+    renewed = db.session.query(GradingItem)\
+        .filter_by(id=item_id, status='claimed', claimed_by=reviewer_id)\
+        .update({'lease_expires_at': expires}, synchronize_session=False)
+    db.session.commit()
+    return bool(renewed)
+
+
+def release(item_id, reviewer_id):
+    """Hand a claimed item back to the queue and commit."""
+    released = db.session.query(GradingItem)\
+        .filter_by(id=item_id, status='claimed', claimed_by=reviewer_id)\
+        .update({'status': 'pending', 'claimed_by': None, 'lease_expires_at': None},
+                synchronize_session=False)
+    db.session.commit()
+    return bool(released)
+
+
+def held_by_others(submissions, reviewer_id):
+    """The (section_id, user_id) submissions on which another reviewer holds
+    a live lease."""
+    if not submissions:
+        return set()
+    rows = db.session.query(GradingItem.section_id, GradingItem.user_id).filter(
+        tuple_(GradingItem.section_id, GradingItem.user_id).in_(list(submissions)),
+        GradingItem.status == 'claimed', GradingItem.claimed_by != reviewer_id,
+        GradingItem.lease_expires_at >= _utcnow()
+    ).all()
+    return {tuple(row) for row in rows}
+
+
+def held_by_other(section_id, user_id, reviewer_id):
+    """True while another reviewer holds a live lease on this submission."""
+    return bool(held_by_others({(section_id, user_id)}, reviewer_id))
+
+
+def mark_graded(section_id, user_ids):
+    """Close the items of the reviewed submissions. Runs inside the caller's
+    transaction; the caller commits."""
+    db.session.query(GradingItem)\
+        .filter(GradingItem.section_id == section_id, GradingItem.user_id.in_(list(user_ids)))\
+        .update({'status': 'done', 'claimed_by': None, 'lease_expires_at': None, 'graded_at': _utcnow()},
+                synchronize_session=False)
+
+
+def queue_counts():
+    """{section_type: {'pending': n, 'claimed': n}} over the open queue."""
+    counts = {}
+    rows = db.session.query(GradingItem.section_type, GradingItem.status, func.count(GradingItem.id))\
+        .filter(GradingItem.status.in_(('pending', 'claimed')))\
+        .group_by(GradingItem.section_type, GradingItem.status).all()
+    for section_type, status, n in rows:
+        counts.setdefault(section_type, {'pending': 0, 'claimed': 0})[status] = n
+    return counts
+
+
+def item_payload(item):
+    return {
+        'id': item.id,
+        'section_id': item.section_id,
+        'section_type': item.section_type,
+        'student_id': item.user_id,
+        'status': item.status,
+        'claimed_by': item.claimed_by,
+        'lease_expires_at': item.lease_expires_at.isoformat() if item.lease_expires_at else None,
+        'submitted_at': item.submitted_at.isoformat() if item.submitted_at else None
+    }
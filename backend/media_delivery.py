@@ -0,0 +1,123 @@
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_file
+
+from media_store import BLOB_FOLDER
+
+# Types the browser's <audio>/<img> elements expect for the formats we store;
+# anything else falls back to the mimetypes table
+MEDIA_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.wav': 'audio/wav',
+    '.ogg': 'audio/ogg',
+    '.oga': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.webm': 'audio/webm',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+BLOB_NAME = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+# MEDIA_DELIVERY modes
+#   app          werkzeug send_file (full responses already go through
+#                wsgi.file_wrapper; byte ranges are copied in Python)
+#   sendfile     byte ranges also go through wsgi.file_wrapper, so servers
+#                with a sendfile-capable wrapper (gunicorn, mod_wsgi) send
+#                every response from the kernel
+#   x-accel      nginx: reply with X-Accel-Redirect to MEDIA_ACCEL_PREFIX
+#   x-sendfile   Apache mod_xsendfile / lighttpd: reply with X-Sendfile
+DELIVERY_MODES = ('app', 'sendfile', 'x-accel', 'x-sendfile')
+CHUNK_SIZE = 64 * 1024
+
+
+# Media delivery for /files/<path>
+#
+# Responses are conditional: Range requests get 206 partial content,
+# If-None-Match / If-Modified-Since get 304. Content-addressed blobs are
+# immutable, so their ETag is the content hash and clients may cache them
+# for a year; anything else must be revalidated. In the proxy modes Flask
+# only authorizes the request and answers 304s; the proxy sends the bytes
+# and handles Range itself.
+
+def media_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    return MEDIA_TYPES.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def blob_digest(path):
+    """SHA-256 of a content-addressed blob, or None for other files."""
+    parts = path.replace(os.sep, '/').split('/')
+    if len(parts) >= 4 and parts[-4] == BLOB_FOLDER and BLOB_NAME.match(parts[-1]):
+        return parts[-1].split('.')[0]
+    return None
+
+
+def file_wrapper_range(response, file_path):
+    """Replace the Python-side range iterator of a 206 response with the
+    server's wsgi.file_wrapper positioned at the start of the range. The
+    server sends Content-Length bytes from the current file offset."""
+    wrapper = request.environ.get('wsgi.file_wrapper')
+    if wrapper is None or response.status_code != 206:
+        return response
+
+    f = open(file_path, 'rb')
+    f.seek(response.content_range.start)
+    response.response.close()
+    response.response = wrapper(f, CHUNK_SIZE)
+    return response
+
+
+def proxy_response(response, file_path, rel_path, mode):
+    """Drop the body and tell the front proxy which file to send."""
+    response.response.close()
+    response.response = []
+    response.headers.pop('Content-Length', None)
+    if mode == 'x-accel':
+        prefix = current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{rel_path.replace(os.sep, '/')}"
+    else:
+        response.headers['X-Sendfile'] = file_path
+    # Validators are still checked here; ranges are left to the proxy
+    response = response.make_conditional(request.environ)
+    if response.status_code == 304:
+        response.headers.pop('X-Accel-Redirect', None)
+        response.headers.pop('X-Sendfile', None)
+    return response
+
+
+def media_response(file_path, rel_path):
+    """Serve ``file_path`` (``rel_path`` relative to BASE_DIR) according to
+    the MEDIA_DELIVERY setting."""
+    mode = current_app.config['MEDIA_DELIVERY']
+    proxied = mode in ('x-accel', 'x-sendfile')
+    digest = blob_digest(file_path)
+    response = send_file(
+        file_path,
+        mimetype=media_type(file_path),
+        as_attachment=False,
+        conditional=not proxied,
+        etag=digest or True,
+        max_age=IMMUTABLE_MAX_AGE if digest else 0
+    )
+    if proxied:
+        response = proxy_response(response, file_path, rel_path, mode)
+    elif mode == 'sendfile':
+        response = file_wrapper_range(response, file_path)
+
+    # Advertise ranges on full responses too, or players will not seek by range
+    response.accept_ranges = 'bytes'
+    if digest:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
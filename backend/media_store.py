@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+from sqlalchemy import func, select, union_all
+from werkzeug.utils import secure_filename
+
+from models import db, ListeningAudio, QuestionAudio, SpeakingTask, WritingTask, SpeakingResponse
+
+BLOB_FOLDER = 'blobs'
+TOMBSTONE_EXT = '.gc'  # a blob the GC is about to remove
+
+# Every column that references a media file
+MEDIA_COLUMNS = [
+    ListeningAudio.audio_url,
+    ListeningAudio.photo_url,
+    QuestionAudio.audio_url,
+    SpeakingTask.audio_url,
+    WritingTask.audio_url,
+    SpeakingResponse.audio_url,
+]
+
+
+# Content-addressed media store
+#
+# Blobs are stored as blobs/<aa>/<bb>/<sha256><ext> under UPLOAD_FOLDER, so
+# identical uploads share one file and different files can never overwrite
+# each other. Rows reference blobs by URL; a blob's reference count is the
+# number of MEDIA_COLUMNS values pointing at it, and blobs nobody references
+# are removed by MediaGarbageCollector instead of by the request handlers.
+#
+# A deduplicated upload reuses an existing blob, which the GC may be
+# removing at that very moment. The GC first renames a blob to a tombstone
+# and only then checks its age; store_blob refreshes the mtime of the blob
+# it reuses and writes the blob again if it is gone. Either store_blob
+# touches the blob before the rename (the GC sees a fresh mtime and puts it
+# back) or after it (the touch fails and the blob is re-created).
+# Files from before the store (per-type folders) are never collected.
+
+def blob_relpath(sha256, filename):
+    ext = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    return f'{BLOB_FOLDER}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}'
+
+
+def store_blob(staged, upload_folder, filename):
+    """Move a StagedUpload into the store and return its URL. If the blob
+    already exists the staged copy is dropped."""
+    rel_path = blob_relpath(staged.sha256.hexdigest(), filename)
+    path = os.path.join(upload_folder, rel_path)
+    url = f'/{upload_folder}/{rel_path}'
+
+    try:
+        os.utime(path)  # fresh mtime keeps the GC grace period away from a blob about to be referenced
+        staged.close()
+        return url
+    except FileNotFoundError:
+        pass  # new blob, or one the GC just took
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staged.flush()
+    os.fsync(staged.fileno())
+    os.chmod(staged.path, 0o644)
+    os.replace(staged.path, path)
+    staged.persisted = True
+    return url
+
+
+def reference_counts():
+    """Return {url: number of rows referencing it} over MEDIA_COLUMNS."""
+    urls = union_all(*[
+        select(column.label('url')).where(column.isnot(None)) for column in MEDIA_COLUMNS
+    ]).subquery()
+    return dict(db.session.execute(
+        select(urls.c.url, func.count()).group_by(urls.c.url)
+    ).all())
+
+
+def collect_garbage(upload_folder, grace_seconds):
+    """Remove blobs no row references. Blobs younger than ``grace_seconds``
+    are kept: their rows may not be committed yet. References are matched by
+    blob name (digest and extension), whatever prefix their URL carries."""
+    referenced = {os.path.basename(url) for url in reference_counts()}
+    now = time.time()
+    removed = 0
+
+    for dirpath, _, filenames in os.walk(os.path.join(upload_folder, BLOB_FOLDER)):
+        for name in filenames:
+            interrupted = name.endswith(TOMBSTONE_EXT)  # left by a pass that died, or one running in another worker
+            blob_name = name[:-len(TOMBSTONE_EXT)] if interrupted else name
+            path = os.path.join(dirpath, blob_name)
+            tombstone = path + TOMBSTONE_EXT
+            try:
+                if not interrupted:
+                    if blob_name in referenced or now - os.path.getmtime(path) <= grace_seconds:
+                        continue
+                    os.rename(path, tombstone)
+                if blob_name in referenced or now - os.path.getmtime(tombstone) <= grace_seconds:
+                    os.replace(tombstone, path)  # store_blob reused it meanwhile
+                else:
+                    os.remove(tombstone)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+class MediaGarbageCollector(threading.Thread):
+    """Background thread running collect_garbage every ``interval`` seconds,
+    or sooner when request_collection() is called."""
+
+    def __init__(self, app, interval, grace_seconds):
+        super().__init__(name='media-gc', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self._wakeup = threading.Event()
+
+    def request_collection(self):
+        self._wakeup.set()
+
+    def run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    collect_garbage(self.app.config['UPLOAD_FOLDER'], self.grace_seconds)
+                except Exception:
+                    self.app.logger.exception('media garbage collection failed')
+                finally:
+                    db.session.remove()
@@ -0,0 +1,118 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+# Request metrics
+#
+# Every request records, per (method, route): latency, number of SQL
+# statements, SQL time and response bytes as histograms, plus a count per
+# status code. SQL statements are counted with engine events on all
+# engines and attributed to the request running on the same thread.
+# Recording is a few dict updates under a lock; the Prometheus text is only
+# built when /metrics is scraped. Values are per process: scrape every
+# worker, or run a single worker per metrics target.
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum:g}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+HISTOGRAMS = [
+    ('http_request_duration_seconds', 'Request latency', LATENCY_BUCKETS),
+    ('http_request_sql_statements', 'SQL statements per request', QUERY_COUNT_BUCKETS),
+    ('http_request_sql_duration_seconds', 'SQL time per request', LATENCY_BUCKETS),
+    ('http_response_size_bytes', 'Response body size', SIZE_BUCKETS),
+]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context rather than the connection, so a
+    # statement that raises leaves nothing behind for the next one
+    context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += time.perf_counter() - context._metrics_started
+
+
+class RequestMetrics:
+    """Collect per-route request metrics for ``app`` and serve them at
+    ``path`` in the Prometheus text format."""
+
+    def __init__(self, app, path='/metrics'):
+        self._routes = {}
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+        app.before_request(self.start_request)
+        app.after_request(self.record_request)
+        app.add_url_rule(path, 'metrics', self.render)
+
+    def start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    def record_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (request.method, route)
+        values = (time.perf_counter() - started, g.sql_statements, g.sql_seconds,
+                  response.content_length or 0)
+
+        with self._lock:
+            histograms = self._routes.get(key)
+            if histograms is None:
+                histograms = self._routes[key] = [Histogram(buckets) for _, _, buckets in HISTOGRAMS]
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+            status_key = key + (response.status_code,)
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+        return response
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for index, (name, help_text, _) in enumerate(HISTOGRAMS):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (method, route), histograms in sorted(self._routes.items()):
+                    lines.extend(histograms[index].samples(name, f'method="{method}",route="{route}"'))
+
+            lines.append('# HELP http_requests_total Requests by status code')
+            lines.append('# TYPE http_requests_total counter')
+            for (method, route, status), count in sorted(self._statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
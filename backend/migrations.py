@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.schema import CreateIndex
+
+from models import db
+
+
+# Schema upgrades for existing databases
+#
+# db.create_all() only creates missing tables. Columns added to tables that
+# already shipped are listed here and added in place, and every index
+# declared on the models (see benchmarks/query_plans.py for the lookups they
+# serve) is created if the database lacks it; indexes the models dropped
+# are dropped too. Safe to run on every start,
+# including by several workers starting at once: on PostgreSQL the upgrade
+# holds an advisory lock so workers run it one after another, and every
+# statement tolerates a column or index that appeared since it was
+# inspected (IF NOT EXISTS, or a re-check where SQLite has no such clause).
+
+UPGRADE_LOCK_KEY = 0x1E175  # pg_advisory_lock key taken by upgrade_schema
+
+ADDED_COLUMNS = [
+    ('user_answers', 'attempt_id'),
+    ('sections', 'cache_version'),
+    ('attempts', 'key_version'),
+    ('rescore_jobs', 'heartbeat_at'),
+    ('scores', 'speaking_response_id'),
+    ('scores', 'writing_response_id'),
+    ('speaking_responses', 'media_status'),
+    ('speaking_responses', 'source_format'),
+    ('speaking_responses', 'duration_seconds'),
+    ('speaking_responses', 'media_error'),
+    ('speaking_responses', 'media_claim_expires_at'),
+    ('speaking_responses', 'processed_at'),
+]
+
+# Indexes that shipped once and are no longer declared on the models
+DROPPED_INDEXES = [
+    'ix_sections_section_type',  # superseded by ix_sections_type_created_at_id
+    'ix_grading_items_open',  # superseded by ix_grading_items_open_queue (claims order by submitted_at)
+]
+
+# Idempotent data fixes run after the columns exist
+BACKFILLS = [
+    # Keyset pagination needs a created_at on every section
+    'UPDATE sections SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL',
+] + [
+    # Point scores at their response through the typed foreign keys. Only
+    # the latest score of a response is linked (older duplicates would
+    # break the unique index), and scores of deleted responses stay unlinked.
+    f'''UPDATE scores SET {kind}_response_id = response_id
+        WHERE response_type = '{kind}' AND {kind}_response_id IS NULL
+          AND id = (SELECT MAX(s.id) FROM scores s
+                    WHERE s.response_type = '{kind}' AND s.response_id = scores.response_id)
+          AND EXISTS (SELECT 1 FROM {kind}_responses r WHERE r.id = scores.response_id)
+          AND NOT EXISTS (SELECT 1 FROM scores s
+                          WHERE s.{kind}_response_id = scores.response_id)'''
+    for kind in ('speaking', 'writing')
+]
+
+# Data fixes run once per database; each is recorded in applied_backfills in
+# the same transaction, so a fix that fails is retried on the next start
+ONE_OFF_BACKFILLS = [
+    # Queue the speaking/writing submissions made before the grading queue
+    # existed; pending unless every response already has a score
+    (f'grading_items_{kind}', f'''INSERT INTO grading_items (section_id, section_type, user_id, status, submitted_at)
+        SELECT t.section_id, '{kind}', r.user_id,
+               CASE WHEN COUNT(s.id) < COUNT(r.id) THEN 'pending' ELSE 'done' END,
+               MAX(r.created_at)
+        FROM {kind}_responses r
+        JOIN {kind}_tasks t ON t.id = r.task_id
+        LEFT JOIN scores s ON s.{kind}_response_id = r.id
+        WHERE NOT EXISTS (SELECT 1 FROM grading_items g
+                          WHERE g.section_id = t.section_id AND g.user_id = r.user_id)
+        GROUP BY t.section_id, r.user_id''')
+    for kind in ('speaking', 'writing')
+]
+
+applied_backfills = db.Table(
+    'applied_backfills',
+    db.Column('name', db.String(100), primary_key=True),
+    db.Column('applied_at', db.DateTime, nullable=False, default=db.func.current_timestamp())
+)
+
+
+def add_column_ddl(column, dialect):
+    if_not_exists = ' IF NOT EXISTS' if dialect.name == 'postgresql' else ''
+    ddl = f'ALTER TABLE {column.table.name} ADD COLUMN{if_not_exists} {column.name} {column.type.compile(dialect)}'
+    if column.server_default is not None:
+        ddl += f' DEFAULT {column.server_default.arg}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    for fk in column.foreign_keys:
+        ddl += f' REFERENCES {fk.column.table.name} ({fk.column.name})'
+        if fk.ondelete:
+            ddl += f' ON DELETE {fk.ondelete}'
+    return ddl
+
+
+def add_missing_columns(inspector):
+    for table_name, column_name in ADDED_COLUMNS:
+        if column_name in {c['name'] for c in inspector.get_columns(table_name)}:
+            continue
+        column = db.metadata.tables[table_name].c[column_name]
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text(add_column_ddl(column, conn.dialect)))
+        except DBAPIError:
+            # Another worker added it meanwhile (SQLite has no ADD COLUMN IF NOT EXISTS)
+            if column_name not in {c['name'] for c in inspect(db.engine).get_columns(table_name)}:
+                raise
+
+
+def sync_indexes(inspector):
+    # On PostgreSQL build and drop indexes CONCURRENTLY (outside a
+    # transaction) so upgrading a live database does not block writes to
+    # hot tables
+    concurrently = db.engine.dialect.name == 'postgresql'
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for name in DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}"))
+        for table in db.metadata.sorted_tables:
+            existing = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    if concurrently:
+                        index.dialect_options['postgresql']['concurrently'] = True
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def run_one_off_backfills():
+    with db.engine.connect() as conn:
+        applied = set(conn.execute(applied_backfills.select().with_only_columns(applied_backfills.c.name)).scalars())
+    for name, statement in ONE_OFF_BACKFILLS:
+        if name in applied:
+            continue
+        try:
+            with db.engine.begin() as conn:
+                # The marker goes first: a worker running the same fix
+                # concurrently waits on it and then backs out
+                conn.execute(applied_backfills.insert().values(name=name))
+                conn.execute(text(statement))
+        except IntegrityError:
+            pass  # applied by another worker meanwhile, or raced a live submission (retried next start)
+
+
+@contextmanager
+def upgrade_lock():
+    """Hold the upgrade advisory lock (PostgreSQL only) for the block."""
+    if db.engine.dialect.name != 'postgresql':
+        yield
+        return
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': UPGRADE_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': UPGRADE_LOCK_KEY})
+
+
+def upgrade_schema():
+    """Bring the database up to date with models.py."""
+    with upgrade_lock():
+        db.create_all()
+        inspector = inspect(db.engine)
+        add_missing_columns(inspector)
+        with db.engine.begin() as conn:
+            for statement in BACKFILLS:
+                conn.execute(text(statement))
+        run_one_off_backfills()
+        sync_indexes(inspector)
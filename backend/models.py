@@ -1,8 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import BigInteger, DateTime
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.compiler import compiles
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+# SQLite only autoincrements INTEGER PRIMARY KEY columns (still 64-bit there),
+# so render BigInteger as INTEGER to keep local and benchmark databases usable.
+@compiles(BigInteger, 'sqlite')
+def _compile_big_integer_sqlite(type_, compiler, **kw):
+    return 'INTEGER'
+
+# SQLite stores CURRENT_TIMESTAMP as 'YYYY-MM-DD HH:MM:SS' text. Bind values
+# in the same format so created_at compares correctly in keyset pagination.
+SecondsDateTime = DateTime().with_variant(sqlite.DATETIME(
+    storage_format='%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d'
+), 'sqlite')
+
 # Users Model
 class User(db.Model):
     __tablename__ = 'users'
@@ -29,18 +44,25 @@ class Section(db.Model):
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     section_type = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(SecondsDateTime, nullable=False, default=db.func.current_timestamp())
+    cache_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped by every edit (see section_cache.py)
 
-    listening_audios = db.relationship('ListeningAudio', backref='section', lazy=True)
-    reading_passages = db.relationship('ReadingPassage', backref='section', lazy=True)
-    speaking_tasks = db.relationship('SpeakingTask', backref='section', lazy=True)
-    writing_tasks = db.relationship('WritingTask', backref='section', lazy=True)
+    # Section lists page by (created_at, id), within a type or across all of them
+    __table_args__ = (
+        db.Index('ix_sections_type_created_at_id', 'section_type', 'created_at', 'id'),
+        db.Index('ix_sections_created_at_id', 'created_at', 'id'),
+    )
+
+    listening_audios = db.relationship('ListeningAudio', backref='section', lazy=True, order_by='ListeningAudio.id')
+    reading_passages = db.relationship('ReadingPassage', backref='section', lazy=True, order_by='ReadingPassage.id')
+    speaking_tasks = db.relationship('SpeakingTask', backref='section', lazy=True, order_by='SpeakingTask.task_number')
+    writing_tasks = db.relationship('WritingTask', backref='section', lazy=True, order_by='WritingTask.task_number')
 
 # Listening Audios Model
 class ListeningAudio(db.Model):
     __tablename__ = 'listening_audios'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False)
+    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False)
     audio_url = db.Column(db.String(255), nullable=False)
     photo_url = db.Column(db.String(255))
@@ -49,7 +71,7 @@ class ListeningAudio(db.Model):
 class ReadingPassage(db.Model):
     __tablename__ = 'reading_passages'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False)
+    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text, nullable=False)
 
@@ -60,50 +82,51 @@ class Question(db.Model):
     section_type = db.Column(db.String(50), nullable=False)
     type = db.Column(db.String(50), nullable=False)
     prompt = db.Column(db.Text, nullable=False)
-    listening_audio_id = db.Column(db.BigInteger, db.ForeignKey('listening_audios.id'))
-    reading_passage_id = db.Column(db.BigInteger, db.ForeignKey('reading_passages.id'))
-
-    listening_audio = db.relationship('ListeningAudio', backref='questions')
-    reading_passage = db.relationship('ReadingPassage', backref='questions')
-    options = db.relationship('Option', backref='question', lazy=True)
-    table_rows = db.relationship('TableQuestionRow', backref='question', lazy=True)
-    table_columns = db.relationship('TableQuestionColumn', backref='question', lazy=True)
+    listening_audio_id = db.Column(db.BigInteger, db.ForeignKey('listening_audios.id'), index=True)
+    reading_passage_id = db.Column(db.BigInteger, db.ForeignKey('reading_passages.id'), index=True)
+
+    # Options, rows and columns are ordered by id: submissions address them by position
+    listening_audio = db.relationship('ListeningAudio', backref=db.backref('questions', order_by='Question.id'))
+    reading_passage = db.relationship('ReadingPassage', backref=db.backref('questions', order_by='Question.id'))
+    options = db.relationship('Option', backref='question', lazy=True, order_by='Option.id')
+    table_rows = db.relationship('TableQuestionRow', backref='question', lazy=True, order_by='TableQuestionRow.id')
+    table_columns = db.relationship('TableQuestionColumn', backref='question', lazy=True, order_by='TableQuestionColumn.id')
     correct_answers = db.relationship('CorrectAnswer', backref='question', lazy=True)
-    question_audios = db.relationship('QuestionAudio', backref='question', lazy=True)
+    question_audios = db.relationship('QuestionAudio', backref='question', lazy=True, order_by='QuestionAudio.id')
 
 # Options Model
 class Option(db.Model):
     __tablename__ = 'options'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False)
+    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False, index=True)
     option_text = db.Column(db.Text, nullable=False)
 
 # Table Question Rows Model
 class TableQuestionRow(db.Model):
     __tablename__ = 'table_question_rows'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False)
+    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False, index=True)
     row_label = db.Column(db.Text, nullable=False)
 
 # Table Question Columns Model
 class TableQuestionColumn(db.Model):
     __tablename__ = 'table_question_columns'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False)
+    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False, index=True)
     column_label = db.Column(db.Text, nullable=False)
 
 # Question Audio Model
 class QuestionAudio(db.Model):
     __tablename__ = 'question_audios'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False)
+    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False, index=True)
     audio_url = db.Column(db.String(255), nullable=False)
 
 # Correct Answers Model
 class CorrectAnswer(db.Model):
     __tablename__ = 'correct_answers'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False)
+    question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False, index=True)
     table_row_id = db.Column(db.BigInteger, db.ForeignKey('table_question_rows.id'))
     table_column_id = db.Column(db.BigInteger, db.ForeignKey('table_question_columns.id'))
     option_id = db.Column(db.BigInteger, db.ForeignKey('options.id'))
@@ -112,10 +135,34 @@ class CorrectAnswer(db.Model):
     table_column = db.relationship('TableQuestionColumn')
     option = db.relationship('Option')
 
+# Attempts Model
+# One row per objective section submission; answers hang off it and are never rewritten
+class Attempt(db.Model):
+    __tablename__ = 'attempts'
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
+    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False)
+    section_type = db.Column(db.String(50), nullable=False)
+    score = db.Column(db.Integer)
+    max_score = db.Column(db.Integer)
+    key_version = db.Column(db.Integer)  # cache_version of the section whose answer key scored it
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    user = db.relationship('User', backref='attempts')
+    section = db.relationship('Section', backref='attempts')
+    answers = db.relationship('UserAnswer', backref='attempt', lazy=True)
+
+    # History is read newest first per user or per section; ids follow submission order
+    __table_args__ = (
+        db.Index('ix_attempts_user_history', 'user_id', 'id'),
+        db.Index('ix_attempts_section_history', 'section_id', 'id'),
+    )
+
 # User Answers Model
 class UserAnswer(db.Model):
     __tablename__ = 'user_answers'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    attempt_id = db.Column(db.BigInteger, db.ForeignKey('attempts.id'), index=True)  # null for answers saved before attempts existed
     question_id = db.Column(db.BigInteger, db.ForeignKey('questions.id'), nullable=False)
     user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
     table_row_id = db.Column(db.BigInteger, db.ForeignKey('table_question_rows.id'))
@@ -128,11 +175,15 @@ class UserAnswer(db.Model):
     table_column = db.relationship('TableQuestionColumn')
     option = db.relationship('Option')
 
+    __table_args__ = (
+        db.Index('ix_user_answers_user_id_question_id', 'user_id', 'question_id'),
+    )
+
 # Speaking Tasks Model
 class SpeakingTask(db.Model):
     __tablename__ = 'speaking_tasks'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False)
+    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False, index=True)
     task_number = db.Column(db.Integer, nullable=False)
     passage = db.Column(db.Text)
     prompt = db.Column(db.Text, nullable=False)
@@ -142,7 +193,7 @@ class SpeakingTask(db.Model):
 class WritingTask(db.Model):
     __tablename__ = 'writing_tasks'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False)
+    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False, index=True)
     task_number = db.Column(db.Integer, nullable=False)
     passage = db.Column(db.Text, nullable=False)
     prompt = db.Column(db.Text, nullable=False)
@@ -156,10 +207,22 @@ class SpeakingResponse(db.Model):
     task_id = db.Column(db.BigInteger, db.ForeignKey('speaking_tasks.id'), nullable=False)
     audio_url = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # Recording pipeline results (see speaking_media.py)
+    media_status = db.Column(db.String(20))  # pending, processing, ready, stored, invalid, failed
+    source_format = db.Column(db.String(20))  # container of the upload: webm, ogg, mp4, wav...
+    duration_seconds = db.Column(db.Float)
+    media_error = db.Column(db.Text)
+    media_claim_expires_at = db.Column(db.DateTime)  # while processing
+    processed_at = db.Column(db.DateTime)
 
     user = db.relationship('User', backref='speaking_responses')
     task = db.relationship('SpeakingTask', backref='responses')
 
+    __table_args__ = (
+        db.Index('ix_speaking_responses_task_id_user_id', 'task_id', 'user_id'),
+        db.Index('ix_speaking_responses_user_id', 'user_id'),
+    )
+
 # Writing Responses Model
 class WritingResponse(db.Model):
     __tablename__ = 'writing_responses'
@@ -173,15 +236,91 @@ class WritingResponse(db.Model):
     user = db.relationship('User', backref='writing_responses')
     task = db.relationship('WritingTask', backref='responses')
 
+    __table_args__ = (
+        db.Index('ix_writing_responses_task_id_user_id', 'task_id', 'user_id'),
+        db.Index('ix_writing_responses_user_id', 'user_id'),
+    )
+
 # Scores Model
 class Score(db.Model):
     __tablename__ = 'scores'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
-    response_id = db.Column(db.BigInteger, nullable=False)
+    response_id = db.Column(db.BigInteger, nullable=False)  # legacy untyped reference, still written
     response_type = db.Column(db.String(50), nullable=False)
+    # Exactly one of these is set; reviews look scores up through them
+    speaking_response_id = db.Column(db.BigInteger, db.ForeignKey('speaking_responses.id', ondelete='CASCADE'))
+    writing_response_id = db.Column(db.BigInteger, db.ForeignKey('writing_responses.id', ondelete='CASCADE'))
     score = db.Column(db.Numeric(5, 2))
     feedback = db.Column(db.Text)
     scored_by = db.Column(db.BigInteger, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
-    scorer = db.relationship('User', backref='scores')
\ No newline at end of file
+    scorer = db.relationship('User', backref='scores')
+
+    __table_args__ = (
+        db.Index('ix_scores_response_id_response_type', 'response_id', 'response_type'),
+        # One score per response; rows of the other type stay out of each index
+        db.Index('ix_scores_speaking_response_id', 'speaking_response_id', unique=True,
+                 postgresql_where=db.text('speaking_response_id IS NOT NULL'),
+                 sqlite_where=db.text('speaking_response_id IS NOT NULL')),
+        db.Index('ix_scores_writing_response_id', 'writing_response_id', unique=True,
+                 postgresql_where=db.text('writing_response_id IS NOT NULL'),
+                 sqlite_where=db.text('writing_response_id IS NOT NULL')),
+    )
+
+# Tests Model: one section of each type, delivered together as a bundle
+class Test(db.Model):
+    __tablename__ = 'tests'
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    title = db.Column(db.String(255), nullable=False)
+    reading_section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id', ondelete='SET NULL'))
+    listening_section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id', ondelete='SET NULL'))
+    speaking_section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id', ondelete='SET NULL'))
+    writing_section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id', ondelete='SET NULL'))
+    created_by = db.Column(db.BigInteger, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def section_ids(self):
+        """{section_type: section_id} (None where the section was deleted)."""
+        return {
+            'reading': self.reading_section_id,
+            'listening': self.listening_section_id,
+            'speaking': self.speaking_section_id,
+            'writing': self.writing_section_id
+        }
+
+# Re-scoring Jobs Model: progress of a background re-scoring run
+class RescoreJob(db.Model):
+    __tablename__ = 'rescore_jobs'
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    total = db.Column(db.Integer)  # attempts to re-score
+    done = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_by = db.Column(db.BigInteger, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    heartbeat_at = db.Column(db.DateTime)  # last sign of life of the worker owning the job
+    finished_at = db.Column(db.DateTime)
+
+# Grading Queue Model: one item per student and speaking/writing section,
+# pending until a reviewer scores it (see grading_queue.py)
+class GradingItem(db.Model):
+    __tablename__ = 'grading_items'
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    section_id = db.Column(db.BigInteger, db.ForeignKey('sections.id'), nullable=False)
+    section_type = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, claimed, done
+    claimed_by = db.Column(db.BigInteger, db.ForeignKey('users.id'))
+    lease_expires_at = db.Column(db.DateTime)
+    submitted_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    graded_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_grading_items_section_id_user_id', 'section_id', 'user_id', unique=True),
+        # The open queue in claim order only: graded items drop out of the index
+        db.Index('ix_grading_items_open_queue', 'section_type', 'submitted_at', 'id',
+                 postgresql_where=db.text("status IN ('pending', 'claimed')"),
+                 sqlite_where=db.text("status IN ('pending', 'claimed')")),
+    )
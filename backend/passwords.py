@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+# Password hashing pool
+#
+# Hashing is deliberately CPU-expensive. Running it inline lets a burst of
+# logins occupy every core, so cheap requests queue behind them. All
+# hashing goes through a small thread pool instead (hashlib's scrypt and
+# PBKDF2 release the GIL, so threads hash in parallel): at most
+# ``max_workers`` hashes run at once and at most ``max_pending`` wait;
+# beyond that callers get HasherBusy and the endpoint answers 503.
+#
+# ``method`` is a werkzeug method string such as "scrypt:32768:8:1" or
+# "pbkdf2:sha256:600000". Stored hashes made with another method are
+# replaced on the next successful login.
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', max_workers=2, max_pending=64, wait_timeout=10):
+        self.method = method
+        # Canonical prefix of hashes made with ``method``, e.g. "scrypt:32768:8:1"
+        self.prefix = generate_password_hash('', method).split('$', 1)[0]
+        self.wait_timeout = wait_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise HasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def _verify(self, password_hash, password):
+        if not check_password_hash(password_hash, password):
+            return False, None
+        if self.needs_rehash(password_hash):
+            return True, generate_password_hash(password, self.method)
+        return True, None
+
+    def verify(self, password_hash, password):
+        """Return (matches, new_hash). ``new_hash`` is set when the password
+        matched but was stored with an outdated method."""
+        return self._run(self._verify, password_hash, password)
@@ -0,0 +1,116 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+LOGGER_NAME = 'toefl.requests'
+REDACTED = '[redacted]'
+SENSITIVE_KEY = re.compile(r'password|passwd|token|secret|authorization|cookie', re.IGNORECASE)
+
+
+# Structured request logging
+#
+# One JSON line per request (method, route, status, latency, sizes). A
+# fraction of requests (REQUEST_LOG_SAMPLE_RATE) also logs a redacted body
+# sample: the parsed JSON or form fields plus the names and sizes of
+# uploaded files. Bodies are never read just for logging, so file contents
+# and other payloads are not buffered. Handlers only put records on a queue;
+# a QueueListener thread formats and writes them.
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        fields = {'ts': round(record.created, 3), 'level': record.levelname}
+        fields.update(getattr(record, 'fields', None) or {'message': record.getMessage()})
+        return json.dumps(fields, default=str)
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if SENSITIVE_KEY.search(str(k)) else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def truncate(value, max_chars):
+    text = json.dumps(value, default=str)
+    if len(text) <= max_chars:
+        return value
+    return text[:max_chars] + '...'
+
+
+def body_sample(max_chars):
+    """Redacted view of the request body, built from what the handler has
+    already parsed."""
+    content_type = request.mimetype
+    if content_type == 'application/json':
+        body = request.get_json(silent=True)  # cached by the handler's own get_json call
+    elif content_type == 'multipart/form-data':
+        body = {
+            'form': request.form.to_dict(),
+            'files': {name: {'filename': f.filename, 'size': getattr(f.stream, 'size', None)}
+                      for name, f in request.files.items()}
+        }
+    else:
+        return None
+    return truncate(redact(body), max_chars)
+
+
+class RequestLogger:
+    """Install request hooks on ``app`` that log through a queue-backed
+    handler."""
+
+    def __init__(self, app, sample_rate=0.0, max_body_chars=2048, stream=None):
+        self.sample_rate = sample_rate
+        self.max_body_chars = max_body_chars
+
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        records = queue.SimpleQueue()
+        self.logger.addHandler(QueueHandler(records))
+        self.listener = QueueListener(records, output, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+        app.before_request(self.start_timer)
+        app.after_request(self.note_response)
+        app.teardown_request(self.log_request)
+
+    def start_timer(self):
+        g.request_started = time.perf_counter()
+
+    def note_response(self, response):
+        g.logged_response = (response.status_code, response.content_length)
+        return response
+
+    def log_request(self, exc):
+        """Teardown hook, so requests that end in an unhandled exception
+        (and never reach after_request) are logged too, as a 500."""
+        started = g.get('request_started')
+        status, response_bytes = g.get('logged_response', (500, None))
+        fields = {
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'path': request.path,
+            'status': status,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 2) if started else None,
+            'request_bytes': request.content_length,
+            'response_bytes': response_bytes,
+            'remote_addr': request.remote_addr,
+        }
+        if exc is not None:
+            fields['error'] = type(exc).__name__
+        if request.method in ('POST', 'PUT', 'PATCH') and random.random() < self.sample_rate:
+            fields['body'] = body_sample(self.max_body_chars)
+        self.logger.info('request', extra={'fields': fields})
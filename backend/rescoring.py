@@ -0,0 +1,156 @@
+import datetime
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy import and_, func, or_
+
+from models import db, Attempt, RescoreJob, Section
+from answer_keys import load_answer_key
+from scoring import load_submissions, score_stored, stale_key, write_scores
+
+
+# Background re-scoring
+#
+# After an answer key changes, a RescoreJob re-scores every attempt of the
+# section scored with an older key: each attempt is stamped with the
+# section's cache_version of the key that scored it (Attempt.key_version).
+# A coordinator thread walks those attempts in id order, CHUNK_SIZE at a
+# time: it reads a chunk's answers in one short transaction, scores the
+# chunk in a process pool and writes the scores plus the job's progress in
+# another short transaction. No transaction spans more than one chunk, so
+# live submissions are never blocked behind the job. The walk has no upper
+# id bound, so it also picks up attempts that another worker scored with
+# the old key while the job ran; a submission committed after the job's
+# last read re-scores itself (see record_scored_attempt in app.py).
+#
+# Jobs only live in the executor of the worker that started them. A job
+# refreshes heartbeat_at as it goes; one left queued or running whose
+# heartbeat is older than STALE_SECONDS (its worker stopped) is taken over
+# by resume_stale, which every worker runs on start. Re-running a job is
+# safe: it only re-scores attempts whose key is still outdated.
+
+CHUNK_SIZE = 500
+STALE_SECONDS = 600
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def _stale(now):
+    return and_(RescoreJob.status.in_(('queued', 'running')),
+                or_(RescoreJob.heartbeat_at.is_(None),
+                    RescoreJob.heartbeat_at < now - datetime.timedelta(seconds=STALE_SECONDS)))
+
+
+class RescoreRunner:
+    def __init__(self, app, processes=2, chunk_size=CHUNK_SIZE):
+        self.app = app
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self._coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rescore')
+        self._pool = None
+
+    def _process_pool(self):
+        # Workers only run score_stored. They are spawned rather than forked
+        # from this threaded server process, so they inherit no held locks
+        # or DB connections.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def start(self, section_id, created_by=None):
+        """Queue a job re-scoring every attempt of a section; returns the job."""
+        job = RescoreJob(section_id=section_id, created_by=created_by, status='queued', heartbeat_at=_utcnow())
+        db.session.add(job)
+        db.session.commit()
+        self._coordinator.submit(self._run, job.id)
+        return job
+
+    def resume_stale(self):
+        """Take over jobs whose worker stopped before finishing them. Needs an
+        app context."""
+        now = _utcnow()
+        job_ids = [job_id for job_id, in db.session.query(RescoreJob.id).filter(_stale(now))]
+        for job_id in job_ids:
+            # Compare-and-set, so only one of the workers starting together takes each job
+            claimed = db.session.query(RescoreJob).filter(RescoreJob.id == job_id, _stale(now))\
+                .update({'status': 'queued', 'done': 0, 'heartbeat_at': now}, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                self._coordinator.submit(self._run, job_id)
+        db.session.commit()
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                self._rescore(job_id)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('re-scoring job %s failed', job_id)
+                db.session.query(RescoreJob).filter_by(id=job_id).update({
+                    'status': 'failed', 'error': str(e), 'finished_at': _utcnow()
+                })
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+    def _rescore(self, job_id):
+        job = db.session.get(RescoreJob, job_id)
+        section = db.session.get(Section, job.section_id)
+        version = section.cache_version  # read before the key, see load_answer_key
+        answer_key = load_answer_key(section.id, section.section_type, version)
+        mode = self.app.config['SCORING_MODE']
+        stale = and_(Attempt.section_id == section.id, stale_key(version))
+
+        total = db.session.query(func.count(Attempt.id)).filter(stale).scalar()
+        job.status, job.total, job.heartbeat_at = 'running', total, _utcnow()
+        db.session.commit()
+
+        # Keep up to ``processes`` chunks scoring while the next one is read
+        in_flight = deque()
+        after_id, done = 0, 0
+        while True:
+            attempt_ids = [a for a, in db.session.query(Attempt.id)
+                           .filter(stale, Attempt.id > after_id)
+                           .order_by(Attempt.id).limit(self.chunk_size).all()]
+            if not attempt_ids:
+                break
+            submissions = load_submissions(section.id, attempt_ids)
+            db.session.commit()  # end the read transaction before scoring
+            in_flight.append(self._process_pool().submit(score_stored, answer_key, submissions, mode))
+            after_id = attempt_ids[-1]
+
+            if len(in_flight) >= self.processes:
+                done = self._write_chunk(job_id, in_flight.popleft().result(), version, done)
+        db.session.commit()
+        while in_flight:
+            done = self._write_chunk(job_id, in_flight.popleft().result(), version, done)
+
+        db.session.query(RescoreJob).filter_by(id=job_id).update({
+            'status': 'done', 'done': done, 'total': max(total, done), 'finished_at': _utcnow()
+        })
+        db.session.commit()
+
+    def _write_chunk(self, job_id, results, version, done):
+        """Persist one chunk's scores and the job's progress together."""
+        done += len(results)
+        write_scores(results, version)
+        db.session.query(RescoreJob).filter_by(id=job_id).update({'done': done, 'heartbeat_at': _utcnow()})
+        db.session.commit()
+        return done
+
+
+def job_payload(job):
+    return {
+        'id': job.id,
+        'section_id': job.section_id,
+        'status': job.status,
+        'total': job.total,
+        'done': job.done,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
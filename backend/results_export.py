@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+
+from sqlalchemy import func, select
+
+from models import db, Attempt, Section, User, Score
+from reviews import REVIEW_KINDS
+from scoring import scale
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+FETCH_SIZE = 1000  # rows per fetch from the server-side cursor
+ROWS_PER_CHUNK = 500  # rows per chunk written to the client
+
+COLUMNS = ['user_id', 'username', 'section_type', 'section_id', 'section_title',
+           'score', 'max_score', 'scaled_score', 'graded', 'submitted_at']
+
+
+# Class-wide result export
+#
+# One row per student and section: the latest attempt for reading and
+# listening, and the summed review scores of the task responses for
+# speaking and writing (max_score counts every task at the review scale's
+# maximum; scaled_score stays empty until every response is scored). Each
+# section type is one query read through a server-side cursor
+# (yield_per), and rows are written to the client as they arrive, so
+# memory stays flat however large the cohort and the first bytes go out
+# before the queries finish.
+
+def objective_query(filters):
+    latest = select(func.max(Attempt.id).label('id'))\
+        .group_by(Attempt.user_id, Attempt.section_id)
+    if filters.get('section_ids') is not None:
+        latest = latest.where(Attempt.section_id.in_(filters['section_ids']))
+    if filters.get('section_type'):
+        latest = latest.where(Attempt.section_type == filters['section_type'])
+    latest = latest.subquery()
+    return select(User.id, User.username, Section.section_type, Section.id, Section.title,
+                  Attempt.score, Attempt.max_score, Attempt.created_at)\
+        .select_from(Attempt)\
+        .join(latest, Attempt.id == latest.c.id)\
+        .join(User, Attempt.user_id == User.id)\
+        .join(Section, Attempt.section_id == Section.id)\
+        .order_by(Section.id, User.id)
+
+
+def reviewed_query(kind, filters):
+    response, task, fk, max_score, _ = REVIEW_KINDS[kind]
+    query = select(User.id, User.username, Section.section_type, Section.id, Section.title,
+                   func.sum(Score.score), func.count(response.id) * max_score,
+                   func.max(response.created_at), func.count(Score.id), func.count(response.id))\
+        .select_from(response)\
+        .join(task, response.task_id == task.id)\
+        .join(Section, task.section_id == Section.id)\
+        .join(User, response.user_id == User.id)\
+        .outerjoin(Score, Score.__table__.c[fk] == response.id)\
+        .group_by(Section.id, User.id, User.username, Section.section_type, Section.title)\
+        .order_by(Section.id, User.id)
+    if filters.get('section_ids') is not None:
+        query = query.where(Section.id.in_(filters['section_ids']))
+    return query
+
+
+def result_rows(filters):
+    """Yield export rows (dicts in COLUMNS order) for ``filters``:
+    section_ids (a list, or None for all) and section_type."""
+    section_type = filters.get('section_type')
+    if section_type in (None, 'reading', 'listening'):
+        for user_id, username, s_type, section_id, title, score, max_score, created_at in db.session.execute(
+                objective_query(filters).execution_options(yield_per=FETCH_SIZE)):
+            yield dict(zip(COLUMNS, (
+                user_id, username, s_type, section_id, title, score, max_score,
+                scale(score, max_score) if score is not None else None, True,
+                created_at.isoformat() if created_at else None)))
+
+    for kind in REVIEW_KINDS:
+        if section_type not in (None, kind):
+            continue
+        for user_id, username, s_type, section_id, title, score, max_score, created_at, scored, responses \
+                in db.session.execute(reviewed_query(kind, filters).execution_options(yield_per=FETCH_SIZE)):
+            graded = scored == responses
+            score = float(score) if score is not None else None
+            yield dict(zip(COLUMNS, (
+                user_id, username, s_type, section_id, title, score, max_score,
+                scale(score, max_score) if graded else None, graded,
+                created_at.isoformat() if created_at else None)))
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()  # the header goes out before the first query runs
+    buffer.seek(0)
+    buffer.truncate()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row.values())
+        if i % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows):
+    lines = []
+    for i, row in enumerate(rows):
+        lines.append(json.dumps(row))
+        if i == 0 or len(lines) == ROWS_PER_CHUNK:  # the first row is sent on its own
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_chunks(export_format, filters):
+    """The export as an iterator of text chunks."""
+    rows = result_rows(filters)
+    return _csv_chunks(rows) if export_format == 'csv' else _ndjson_chunks(rows)
@@ -0,0 +1,132 @@
+from collections import defaultdict
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Score, SpeakingResponse, SpeakingTask, WritingResponse, WritingTask
+import grading_queue
+
+MAX_BULK_REVIEWS = 1000
+
+
+# Bulk review submission
+#
+# Graders send any number of speaking/writing reviews, across students and
+# sections, in one request. Every response the batch names is loaded with
+# one query per type, each item is validated against that, and the valid
+# scores are upserted with a single INSERT ... ON CONFLICT per type on the
+# scores' typed unique indexes. Items fail individually; the rest of the
+# batch is still saved. Submissions whose responses are now all scored
+# leave the grading queue.
+
+REVIEW_KINDS = {
+    # type: (response model, task model, score FK column, max score, feedback required)
+    'speaking': (SpeakingResponse, SpeakingTask, 'speaking_response_id', 10, True),
+    'writing': (WritingResponse, WritingTask, 'writing_response_id', 100, False),
+}
+
+
+def load_responses(kind, response_ids):
+    """{response_id: (section_id, user_id)} for the existing responses."""
+    response, task = REVIEW_KINDS[kind][:2]
+    if not response_ids:
+        return {}
+    rows = db.session.query(response.id, task.section_id, response.user_id)\
+        .join(task, response.task_id == task.id)\
+        .filter(response.id.in_(list(response_ids))).all()
+    return {response_id: (section_id, user_id) for response_id, section_id, user_id in rows}
+
+
+def validate(item, responses, seen):
+    """Error message for an invalid review item, or None."""
+    if not isinstance(item, dict) or item.get('type') not in REVIEW_KINDS:
+        return 'type must be speaking or writing'
+    kind, response_id = item['type'], item.get('response_id')
+    max_score, feedback_required = REVIEW_KINDS[kind][3:]
+    score, feedback = item.get('score'), item.get('feedback')
+    if not isinstance(response_id, int) or response_id not in responses[kind]:
+        return f'No {kind} response {response_id}'
+    if (kind, response_id) in seen:
+        return f'Duplicate review of {kind} response {response_id}'
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= max_score:
+        return f'Invalid score: must be between 0 and {max_score}'
+    if feedback_required and (not isinstance(feedback, str) or not feedback.strip()):
+        return 'Invalid feedback: must be a non-empty string'
+    if feedback is not None and not isinstance(feedback, str):
+        return 'Invalid feedback: must be a string'
+    return None
+
+
+def upsert_scores(kind, rows):
+    """Insert or overwrite the scores of ``rows`` in one statement."""
+    fk = REVIEW_KINDS[kind][2]
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    stmt = dialect.insert(Score).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[fk],
+        index_where=Score.__table__.c[fk].isnot(None),  # the partial unique index
+        set_={'score': stmt.excluded.score, 'feedback': stmt.excluded.feedback,
+              'scored_by': stmt.excluded.scored_by}
+    )
+    db.session.execute(stmt)
+
+
+def close_reviewed(kind, submissions):
+    """Mark done the (section_id, user_id) submissions whose responses all
+    have a score now."""
+    response, task, fk = REVIEW_KINDS[kind][:3]
+    if not submissions:
+        return
+    rows = db.session.query(task.section_id, response.user_id, func.count(response.id), func.count(Score.id))\
+        .join(task, response.task_id == task.id)\
+        .outerjoin(Score, Score.__table__.c[fk] == response.id)\
+        .filter(tuple_(task.section_id, response.user_id).in_(list(submissions)))\
+        .group_by(task.section_id, response.user_id).all()
+    done = defaultdict(set)
+    for section_id, user_id, responses, scored in rows:
+        if responses == scored:
+            done[section_id].add(user_id)
+    for section_id, user_ids in done.items():
+        grading_queue.mark_graded(section_id, user_ids)
+
+
+def bulk_review(items, reviewer_id):
+    """Validate and save ``items``; returns one result per item, in order.
+    The caller commits."""
+    wanted = defaultdict(set)
+    for item in items:
+        if isinstance(item, dict) and item.get('type') in REVIEW_KINDS and isinstance(item.get('response_id'), int):
+            wanted[item['type']].add(item['response_id'])
+    responses = {kind: load_responses(kind, wanted[kind]) for kind in REVIEW_KINDS}
+    held = grading_queue.held_by_others(
+        {submission for kind in responses for submission in responses[kind].values()}, reviewer_id)
+
+    results, seen = [], set()
+    rows, submissions = defaultdict(list), defaultdict(set)
+    for item in items:
+        error = validate(item, responses, seen)
+        if error is None and responses[item['type']][item['response_id']] in held:
+            error = 'Submission is being reviewed by another reviewer'
+        if error:
+            item = item if isinstance(item, dict) else {}
+            results.append({'type': item.get('type'), 'response_id': item.get('response_id'),
+                            'status': 'error', 'error': error})
+            continue
+
+        kind, response_id = item['type'], item['response_id']
+        seen.add((kind, response_id))
+        rows[kind].append({
+            'response_id': response_id,
+            'response_type': kind,
+            REVIEW_KINDS[kind][2]: response_id,
+            'score': item['score'],
+            'feedback': item.get('feedback'),
+            'scored_by': reviewer_id
+        })
+        submissions[kind].add(responses[kind][response_id])
+        results.append({'type': kind, 'response_id': response_id, 'status': 'saved'})
+
+    for kind, kind_rows in rows.items():
+        upsert_scores(kind, kind_rows)
+        close_reviewed(kind, submissions[kind])
+    return results
@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+from sqlalchemy import bindparam, or_
+
+from models import db, Attempt, UserAnswer, Question
+
+SCALED_MAX = 30
+
+ScoreResult = namedtuple('ScoreResult', ['raw', 'max_score', 'scaled'])
+
+
+# Scoring engine for reading and listening
+#
+# Scores submissions against an AnswerKey (answer_keys.py). A submission is
+# {question_id: set of option ids, or of (row_id, column_id) cells for
+# table questions}. score_batch scores any number of submissions of one
+# section in a single pass over the key's questions, so live submits and
+# bulk re-scoring of stored attempts share the same rules.
+#
+# Modes
+#   all_or_nothing  a question earns its points only when the selection
+#                   equals the key exactly
+#   partial         multi-point questions (prose_summary, table) lose one
+#                   point per mistake (a missing, extra or swapped
+#                   selection), down to 0; single-point questions stay all
+#                   or nothing
+
+def _all_or_nothing(key, answer):
+    return key.points if answer == key.correct else 0
+
+
+def _partial(key, answer):
+    if key.points == 1:
+        return _all_or_nothing(key, answer)
+    # A wrong selection in place of a right one counts as one mistake
+    mistakes = max(len(key.correct - answer), len(answer - key.correct))
+    return max(key.points - mistakes, 0)
+
+
+SCORING_MODES = {
+    'all_or_nothing': _all_or_nothing,
+    'partial': _partial,
+}
+
+
+def scale(raw, max_score):
+    """Linear conversion of a raw score to the 0-30 section scale."""
+    if not max_score:
+        return 0
+    return round(raw * SCALED_MAX / max_score)
+
+
+def score_batch(answer_key, submissions, mode='all_or_nothing'):
+    """Score ``submissions`` (a list of submissions) and return a list of
+    ScoreResult in the same order."""
+    question_score = SCORING_MODES[mode]
+    totals = [0] * len(submissions)
+    for question_id, key in answer_key.questions.items():
+        for i, submitted in enumerate(submissions):
+            answer = submitted.get(question_id)
+            if answer:
+                totals[i] += question_score(key, frozenset(answer))
+    return [ScoreResult(raw, answer_key.max_score, scale(raw, answer_key.max_score)) for raw in totals]
+
+
+def stale_key(key_version):
+    """Attempts scored with an answer key older than ``key_version`` (or
+    before attempts recorded their key)."""
+    return or_(Attempt.key_version.is_(None), Attempt.key_version < key_version)
+
+
+def score_submission(answer_key, submitted, mode='all_or_nothing'):
+    return score_batch(answer_key, [submitted], mode)[0]
+
+
+def load_submissions(section_id, attempt_ids=None):
+    """Rebuild the stored submissions of a section's attempts:
+    {attempt_id: submission}. Attempts without answers map to {}."""
+    query = db.session.query(Attempt.id).filter(Attempt.section_id == section_id)
+    if attempt_ids is not None:
+        query = query.filter(Attempt.id.in_(attempt_ids))
+    submissions = {attempt_id: {} for attempt_id, in query.all()}
+    if not submissions:
+        return submissions
+
+    rows = db.session.query(UserAnswer.attempt_id, UserAnswer.question_id, Question.type,
+                            UserAnswer.option_id, UserAnswer.table_row_id, UserAnswer.table_column_id)\
+        .join(Question, UserAnswer.question_id == Question.id)\
+        .filter(UserAnswer.attempt_id.in_(list(submissions)))\
+        .all()
+    for attempt_id, question_id, question_type, option_id, row_id, column_id in rows:
+        answer = submissions[attempt_id].setdefault(question_id, set())
+        answer.add((row_id, column_id) if question_type == 'table' else option_id)
+    return submissions
+
+
+def write_scores(results, key_version):
+    """Persist {attempt_id: ScoreResult}, scored with the answer key of
+    ``key_version``, with one executemany UPDATE. Attempts already scored
+    with a newer key are left alone. Runs in the caller's transaction."""
+    if results:
+        db.session.execute(
+            Attempt.__table__.update()
+            .where(Attempt.id == bindparam('attempt_id'), stale_key(key_version))
+            .values(score=bindparam('score'), max_score=bindparam('max_score'), key_version=key_version),
+            [{'attempt_id': a, 'score': r.raw, 'max_score': r.max_score} for a, r in results.items()]
+        )
+
+
+def score_stored(answer_key, submissions, mode='all_or_nothing'):
+    """Score stored submissions ({attempt_id: submission}) and return
+    {attempt_id: ScoreResult}. Pure function, safe to run in another process."""
+    attempt_ids = list(submissions)
+    return dict(zip(attempt_ids, score_batch(answer_key, [submissions[a] for a in attempt_ids], mode)))
@@ -0,0 +1,174 @@
+import glob
+import hashlib
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from compression import CompressedVariants
+from models import db, Section
+
+
+# Cache of rendered section payloads
+#
+# Entries are keyed by (section_type, section_id, version), where version is
+# the section's cache_version column. Writers never touch cached entries:
+# they bump the version in the same transaction as their edit, so once it
+# commits every worker process misses on the older entries (and a deleted
+# section has no version at all). Reading the version costs one primary-key
+# lookup per request. The in-process LRU is always used; when a shared
+# directory is configured, payloads are also kept there so the workers of
+# a host reuse each other's renders.
+
+class CachedSection(CompressedVariants):
+    """A serialized section payload, its strong ETag and its compressed
+    variants."""
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+
+class SharedDirectoryBackend:
+    """Payloads stored as files in a directory shared by the worker
+    processes of one host. Writes go through a temp file and os.replace so
+    readers never see partial files."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.join(path, 'payloads'), exist_ok=True)
+
+    def _write(self, path, data):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _payload_path(self, section_type, section_id, version):
+        return os.path.join(self.path, 'payloads', f'{section_type}-{section_id}-{version}.json')
+
+    def discard(self, section_id, keep_version=None):
+        """Remove the section's payloads, except those of ``keep_version``."""
+        for path in glob.glob(os.path.join(self.path, 'payloads', f'*-{section_id}-*.json')):
+            if keep_version is None or not path.endswith(f'-{section_id}-{keep_version}.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def get(self, section_type, section_id, version):
+        try:
+            with open(self._payload_path(section_type, section_id, version), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, section_type, section_id, version, body):
+        self._write(self._payload_path(section_type, section_id, version), body)
+        self.discard(section_id, keep_version=version)  # older versions are unreachable
+
+
+class SectionCache:
+    def __init__(self, maxsize=256, shared_dir=None):
+        self.maxsize = maxsize
+        self.shared = SharedDirectoryBackend(shared_dir) if shared_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dependents = []  # VersionedSectionCaches built on this one
+
+    def version(self, section_id):
+        """The section's cache version, or None if it does not exist."""
+        return db.session.query(Section.cache_version).filter_by(id=section_id).scalar()
+
+    def bump(self, section_id):
+        """Invalidate every cached payload of a section. Runs inside the
+        caller's transaction (before deleting the section, for a delete);
+        other processes see the new version once the caller commits."""
+        db.session.query(Section).filter_by(id=section_id)\
+            .update({'cache_version': Section.cache_version + 1}, synchronize_session=False)
+        if self.shared:
+            self.shared.discard(section_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == section_id]:
+                del self._entries[key]
+        for dependent in self._dependents:
+            dependent.discard(section_id)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, section_type, section_id, build, serialize):
+        """Return the CachedSection for a section, rendering it with
+        ``serialize(build(section_id))`` on a miss. Returns None (and caches
+        nothing) when ``build`` finds no such section."""
+        version = self.version(section_id)
+        if version is None:
+            return None
+        key = (section_type, section_id, version)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                return entry
+
+        body = self.shared.get(section_type, section_id, version) if self.shared else None
+        if body is None:
+            payload = build(section_id)
+            if payload is None:
+                return None
+            body = serialize(payload)
+            if self.shared:
+                self.shared.set(section_type, section_id, version, body)
+
+        entry = CachedSection(body)
+        self._remember(key, entry)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class VersionedSectionCache(ABC):
+    """Per-process values derived from a section (answer keys, submission
+    indexes), rebuilt when the section's cache version moves. Abstract:
+    subclasses must override load(). Holds at most ``maxsize`` sections
+    (the section cache's size by default), least recently used first out."""
+
+    def __init__(self, section_cache, maxsize=None):
+        self.section_cache = section_cache
+        self.maxsize = maxsize or section_cache.maxsize
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        section_cache._dependents.append(self)
+
+    @abstractmethod
+    def load(self, section_id, section_type, version):
+        """Build the value for one version of a section."""
+
+    def discard(self, section_id):
+        with self._lock:
+            for key in [k for k in self._values if k[1] == section_id]:
+                del self._values[key]
+
+    def get(self, section_id, section_type):
+        version = self.section_cache.version(section_id)
+        key = (section_type, section_id)
+        with self._lock:
+            cached = self._values.get(key)
+            if cached and cached[0] == version:
+                self._values.move_to_end(key)
+                return cached[1]
+
+        value = self.load(section_id, section_type, version)
+        with self._lock:
+            self._values[key] = (version, value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+        return value
@@ -0,0 +1,88 @@
+from collections import namedtuple
+
+from section_cache import VersionedSectionCache
+from section_payloads import load_reading_section, load_listening_section
+
+
+# Submission index for reading and listening sections
+#
+# Submissions address questions by passage/audio id and options, table rows
+# and columns by position, in the order the section payload lists them.
+# A SectionIndex resolves all of that from memory: it is built from the
+# same loaders as the payloads (so positions match exactly) and cached until
+# the section's version changes, which makes ingesting a submission O(cells)
+# with no queries.
+
+QuestionIndex = namedtuple('QuestionIndex', ['id', 'type', 'option_ids', 'row_ids', 'column_ids'])
+
+
+class SectionIndex:
+    def __init__(self, section_id, groups):
+        self.section_id = section_id
+        self.groups = groups  # {passage or audio id: {question_id: QuestionIndex}}
+
+    def question(self, group_id, question_id):
+        """The question if it belongs to that passage/audio, else None."""
+        return self.groups.get(group_id, {}).get(question_id)
+
+
+def question_index(question):
+    return QuestionIndex(
+        question.id,
+        question.type,
+        [option.id for option in question.options],
+        [row.id for row in question.table_rows] if question.type == 'table' else [],
+        [column.id for column in question.table_columns] if question.type == 'table' else []
+    )
+
+
+def load_section_index(section_id, section_type):
+    """Build the SectionIndex of a reading or listening section, or None if
+    it does not exist."""
+    if section_type == 'reading':
+        section = load_reading_section(section_id)
+        groups = section.reading_passages if section else []
+    else:
+        section = load_listening_section(section_id)
+        groups = section.listening_audios if section else []
+    if not section:
+        return None
+    return SectionIndex(section_id, {
+        group.id: {question.id: question_index(question) for question in group.questions}
+        for group in groups
+    })
+
+
+def table_cells(question, answer):
+    """Resolve a table answer to a set of (row_id, column_id). Accepts stable
+    ids, ``[{"row_id": .., "column_id": ..}, ...]``, or positions,
+    ``{"<row>": {"<column>": true, ...}, ...}``. Raises ValueError on cells
+    outside the table."""
+    cells = set()
+    if isinstance(answer, list):
+        rows, columns = set(question.row_ids), set(question.column_ids)
+        for cell in answer:
+            row_id, column_id = int(cell['row_id']), int(cell['column_id'])
+            if row_id not in rows or column_id not in columns:
+                raise ValueError(f'cell ({row_id}, {column_id}) is not in question {question.id}')
+            cells.add((row_id, column_id))
+        return cells
+
+    for row_pos, selected_columns in answer.items():
+        row, row_ids = int(row_pos), question.row_ids
+        if not 0 <= row < len(row_ids):
+            raise ValueError(f'row {row_pos} is not in question {question.id}')
+        for column_pos, selected in selected_columns.items():
+            column, column_ids = int(column_pos), question.column_ids
+            if not 0 <= column < len(column_ids):
+                raise ValueError(f'column {column_pos} is not in question {question.id}')
+            if selected:  # True indicates the cell is selected
+                cells.add((row_ids[row], column_ids[column]))
+    return cells
+
+
+class SectionIndexCache(VersionedSectionCache):
+    """Per-section SectionIndexes, rebuilt when the section cache version moves."""
+
+    def load(self, section_id, section_type, version):
+        return load_section_index(section_id, section_type)
@@ -0,0 +1,68 @@
+import base64
+import datetime
+
+from sqlalchemy import func, tuple_
+
+from models import Section
+
+SECTION_TYPES = ('reading', 'listening', 'speaking', 'writing')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+# Keyset pagination of section lists
+#
+# Sections are listed in (created_at, id) order, served by the
+# ix_sections_type_created_at_id index, or by ix_sections_created_at_id when
+# every type is listed (the type filter is then dropped: every section has
+# one of SECTION_TYPES, and an IN over all of them would still plan as a
+# sort of the matching rows). A page ends with an opaque cursor
+# encoding the last (created_at, id); the next page starts strictly after
+# it, so a page costs the same however deep it is and rows inserted
+# meanwhile are neither skipped nor repeated.
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(section):
+    raw = f'{section.created_at.isoformat()}|{section.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, section_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(created_at), int(section_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def list_sections(section_types, limit=DEFAULT_PAGE_SIZE, cursor=None, with_total=True):
+    """Return one page of sections of the given types as
+    ``{'sections': [...], 'next_cursor': ..., 'total': ...}``. ``total``
+    (a COUNT over all matching sections) is left out when ``with_total``
+    is false."""
+    query = Section.query
+    if not set(SECTION_TYPES) <= set(section_types):
+        query = query.filter(Section.section_type.in_(section_types))
+    page_query = query
+    if cursor:
+        page_query = page_query.filter(tuple_(Section.created_at, Section.id) > decode_cursor(cursor))
+    # One extra row tells whether there is a next page
+    rows = page_query.order_by(Section.created_at, Section.id).limit(limit + 1).all()
+    sections, has_more = rows[:limit], len(rows) > limit
+
+    page = {
+        'sections': [{
+            'id': section.id,
+            'type': section.section_type,
+            'title': section.title,
+            'created_at': section.created_at.isoformat()
+        } for section in sections],
+        'next_cursor': encode_cursor(sections[-1]) if has_more else None
+    }
+    if with_total:
+        page['total'] = query.with_entities(func.count(Section.id)).scalar()
+    return page
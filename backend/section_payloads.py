@@ -0,0 +1,150 @@
+from sqlalchemy.orm import selectinload
+
+from models import Section, ListeningAudio, ReadingPassage, Question
+
+
+# Section payload builders
+#
+# Each builder loads the whole section tree with one SELECT per level
+# (selectinload), so the number of queries stays fixed no matter how many
+# passages, audios or questions a section has.
+
+def load_reading_section(section_id):
+    """Load a reading section with passages, questions and options (4 queries)."""
+    return Section.query.filter_by(id=section_id, section_type='reading').options(
+        selectinload(Section.reading_passages)
+        .selectinload(ReadingPassage.questions)
+        .selectinload(Question.options)
+    ).first()
+
+
+def load_listening_section(section_id):
+    """Load a listening section with audios, questions and their options,
+    table rows/columns and question audios (7 queries)."""
+    questions = selectinload(Section.listening_audios).selectinload(ListeningAudio.questions)
+    return Section.query.filter_by(id=section_id, section_type='listening').options(
+        questions.selectinload(Question.options),
+        questions.selectinload(Question.table_rows),
+        questions.selectinload(Question.table_columns),
+        questions.selectinload(Question.question_audios),
+    ).first()
+
+
+def load_task_section(section_id, section_type):
+    """Load a speaking or writing section with its tasks (2 queries)."""
+    tasks = Section.speaking_tasks if section_type == 'speaking' else Section.writing_tasks
+    return Section.query.filter_by(id=section_id, section_type=section_type).options(
+        selectinload(tasks)
+    ).first()
+
+
+def reading_question_payload(question):
+    return {
+        'id': question.id,
+        'type': question.type,
+        'prompt': question.prompt,
+        'options': [o.option_text for o in question.options]
+    }
+
+
+def listening_question_payload(question):
+    if question.type == 'table':
+        return {
+            'id': question.id,
+            'type': question.type,
+            'prompt': question.prompt,
+            'rows': [row.row_label for row in question.table_rows],
+            'columns': [col.column_label for col in question.table_columns],
+            # Stable ids, accepted on submit instead of positions
+            'row_ids': [row.id for row in question.table_rows],
+            'column_ids': [col.id for col in question.table_columns]
+        }
+
+    payload = {
+        'id': question.id,
+        'type': question.type,
+        'prompt': question.prompt,
+        'options': [o.option_text for o in question.options]
+    }
+    if question.type == 'audio':
+        payload['audio_url'] = question.question_audios[0].audio_url if question.question_audios else None
+    return payload
+
+
+def build_reading_payload(section_id):
+    """Return the GET /reading/<id> payload, or None if the section does not exist."""
+    section = load_reading_section(section_id)
+    if not section:
+        return None
+
+    return {
+        'id': section.id,
+        'title': section.title,
+        'passages': [{
+            'id': passage.id,
+            'title': passage.title,
+            'text': passage.content,
+            'questions': [reading_question_payload(q) for q in passage.questions]
+        } for passage in section.reading_passages]
+    }
+
+
+def build_listening_payload(section_id):
+    """Return the GET /listening/<id> payload, or None if the section does not exist."""
+    section = load_listening_section(section_id)
+    if not section:
+        return None
+
+    return {
+        'id': section.id,
+        'title': section.title,
+        'audios': [{
+            'id': audio.id,
+            'title': audio.title,
+            'audio_url': audio.audio_url,
+            'photo_url': audio.photo_url,
+            'questions': [listening_question_payload(q) for q in audio.questions]
+        } for audio in section.listening_audios]
+    }
+
+
+def task_payload(task):
+    return {
+        'id': task.id,
+        'task_number': task.task_number,
+        'passage': task.passage,
+        'prompt': task.prompt,
+        'audio_url': task.audio_url
+    }
+
+
+def build_speaking_payload(section_id):
+    """Return the GET /speaking/<id> payload, or None if the section does not exist."""
+    section = load_task_section(section_id, 'speaking')
+    if not section:
+        return None
+
+    tasks_data = [task_payload(t) for t in section.speaking_tasks]
+    return {
+        'id': section.id,
+        'title': section.title,
+        'task1': tasks_data[0],
+        'task2': tasks_data[1],
+        'task3': tasks_data[2],
+        'task4': tasks_data[3]
+    }
+
+
+def build_writing_payload(section_id):
+    """Return the GET /writing/<id> payload, or None if the section does not exist."""
+    section = load_task_section(section_id, 'writing')
+    if not section:
+        return None
+
+    tasks_data = [task_payload(t) for t in section.writing_tasks]
+    return {
+        'id': section.id,
+        'title': section.title,
+        'task1': tasks_data[0],
+        'task2': tasks_data[1]
+    }
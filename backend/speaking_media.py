@@ -0,0 +1,236 @@
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy import and_, or_
+
+from models import db, SpeakingResponse
+from uploads import stage_stream, staging_dir
+from media_store import store_blob
+
+OUTPUT_EXT = '.mp3'
+LOUDNESS_TARGET = 'I=-16:TP=-1.5:LRA=11'  # EBU R128 loudnorm, speech-friendly level
+TRANSCODE_TIMEOUT = 300  # seconds per recording
+CLAIM_SECONDS = 1800  # a recording claimed by a worker that died is taken over after this
+
+
+# Speaking recording pipeline
+#
+# Browsers upload MediaRecorder blobs (usually WebM/Opus, sometimes Ogg, MP4
+# or WAV) at whatever bitrate they chose. After a speaking submission
+# commits, each recording is processed in a worker process, off the request
+# path:
+#   1. validate: the container is recognised from its magic bytes
+#   2. transcode to mono MP3 at SPEAKING_AUDIO_BITRATE with loudness
+#      normalized (ffmpeg loudnorm), so every recording plays at the same
+#      level in every browser
+#   3. probe the duration of the result (MediaRecorder files often carry
+#      none) and check it against SPEAKING_MAX_SECONDS
+# The transcoded file goes into the media store and the response row is
+# switched to it; the raw upload is left to the media GC. Without ffprobe
+# the duration of the MP3 is computed from its size (it is constant
+# bitrate). Without ffmpeg the recording is validated, WAV durations are
+# probed in pure Python and the upload is kept as is (media_status 'stored').
+#
+# A worker claims a recording before processing it: a compare-and-set
+# UPDATE from pending to processing with a claim expiry, so the workers
+# that all resume the pending recordings on start process each one once.
+# A claim that expires (its worker died) makes the recording resumable
+# again. Results are only written under the claim that produced them.
+#
+# media_status: pending, processing, ready, stored, invalid (not audio or
+# too long), failed (the transcoder errored); NULL for responses saved
+# before the pipeline existed.
+
+MAGIC_FORMATS = [
+    # (offset, bytes, format)
+    (0, b'\x1a\x45\xdf\xa3', 'webm'),  # EBML: WebM / Matroska
+    (0, b'OggS', 'ogg'),
+    (0, b'ID3', 'mp3'),
+    (4, b'ftyp', 'mp4'),
+    (0, b'fLaC', 'flac'),
+]
+
+
+def detect_format(path):
+    """Container of an audio file from its first bytes, or None."""
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    for offset, magic, name in MAGIC_FORMATS:
+        if head[offset:offset + len(magic)] == magic:
+            return name
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:  # bare MPEG audio frame
+        return 'mp3'
+    return None
+
+
+def url_path(url, upload_folder):
+    prefix = f'/{upload_folder}/'
+    if not url.startswith(prefix):
+        raise ValueError(f'{url} is not in {upload_folder}')
+    return os.path.join(upload_folder, url[len(prefix):])
+
+
+def probe_duration(path, ffprobe=None):
+    """Duration in seconds, or None when it cannot be determined."""
+    if ffprobe:
+        out = subprocess.run([ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', path],
+                             capture_output=True, timeout=TRANSCODE_TIMEOUT, check=True).stdout
+        duration = json.loads(out).get('format', {}).get('duration')
+        return float(duration) if duration not in (None, 'N/A') else None
+    try:
+        with wave.open(path, 'rb') as w:
+            return w.getnframes() / w.getframerate()
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
+
+
+def cbr_duration(path, bitrate):
+    """Duration of a constant-bitrate MP3 written by transcode(), from its
+    size; used when ffprobe is missing."""
+    with open(path, 'rb') as f:
+        head = f.read(10)
+    tag = 0
+    if head[:3] == b'ID3':  # skip the ID3v2 tag, whose size is a 4x7-bit syncsafe integer
+        tag = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+    bits_per_second = int(bitrate.rstrip('kK')) * 1000 if bitrate[-1] in 'kK' else int(bitrate)
+    return round((os.path.getsize(path) - tag) * 8 / bits_per_second, 2)
+
+
+def claimable(now):
+    return or_(SpeakingResponse.media_status == 'pending',
+               and_(SpeakingResponse.media_status == 'processing', SpeakingResponse.media_claim_expires_at < now))
+
+
+def transcode(src, dest, ffmpeg, bitrate):
+    subprocess.run([
+        ffmpeg, '-nostdin', '-v', 'error', '-y', '-i', src, '-vn',
+        '-af', f'loudnorm={LOUDNESS_TARGET}', '-ac', '1', '-ar', '44100',
+        '-c:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', dest
+    ], capture_output=True, timeout=TRANSCODE_TIMEOUT, check=True)
+
+
+def process_recording(audio_url, upload_folder, bitrate, max_seconds, ffmpeg=None, ffprobe=None):
+    """Validate, transcode and probe one recording. Runs in a worker process;
+    returns the column values for the SpeakingResponse."""
+    result = {'media_status': 'stored', 'audio_url': audio_url, 'source_format': None,
+              'duration_seconds': None, 'media_error': None}
+    src = url_path(audio_url, upload_folder)
+    result['source_format'] = detect_format(src)
+    if not result['source_format']:
+        return dict(result, media_status='invalid', media_error='Not a recognised audio format')
+
+    probed = src
+    if ffmpeg:
+        fd, tmp = tempfile.mkstemp(dir=staging_dir(upload_folder), suffix=OUTPUT_EXT)
+        os.close(fd)
+        try:
+            transcode(src, tmp, ffmpeg, bitrate)
+            with open(tmp, 'rb') as f:
+                result['audio_url'] = store_blob(stage_stream(f, upload_folder), upload_folder, 'recording' + OUTPUT_EXT)
+        except subprocess.CalledProcessError as e:
+            return dict(result, media_status='failed', media_error=e.stderr.decode(errors='replace')[-500:])
+        except subprocess.TimeoutExpired:
+            return dict(result, media_status='failed', media_error='Transcoding timed out')
+        finally:
+            os.remove(tmp)
+        result['media_status'] = 'ready'
+        probed = url_path(result['audio_url'], upload_folder)
+
+    if ffmpeg and not ffprobe:
+        result['duration_seconds'] = cbr_duration(probed, bitrate)
+    else:
+        result['duration_seconds'] = probe_duration(probed, ffprobe)
+    if result['duration_seconds'] is not None and result['duration_seconds'] > max_seconds:
+        return dict(result, audio_url=audio_url, media_status='invalid',
+                    media_error=f'Recording is longer than {max_seconds} seconds')
+    return result
+
+
+class SpeakingMediaPipeline:
+    """Processes recordings of committed speaking responses in a process
+    pool; a coordinator thread writes the results back."""
+
+    def __init__(self, app, processes=2, bitrate='64k', max_seconds=600, on_done=None):
+        self.app = app
+        self.processes = processes
+        self.bitrate = bitrate
+        self.max_seconds = max_seconds
+        self.on_done = on_done  # called after results are committed, e.g. to wake the media GC
+        self.ffmpeg = shutil.which('ffmpeg')
+        self.ffprobe = shutil.which('ffprobe')
+        self._coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix='speaking-media')
+        self._pool = None
+
+    def _process_pool(self):
+        # Spawned, not forked from the threaded server (see rescoring.py)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def submit(self, response_ids):
+        """Queue the recordings of these (committed) responses."""
+        if response_ids:
+            self._coordinator.submit(self._run, list(response_ids))
+
+    def resume_pending(self):
+        """Queue recordings left pending by a previous run, or claimed by a
+        worker that died. Needs an app context."""
+        now = datetime.datetime.utcnow()
+        self.submit([r for r, in db.session.query(SpeakingResponse.id).filter(claimable(now))])
+        db.session.commit()
+
+    def _run(self, response_ids):
+        with self.app.app_context():
+            try:
+                self._process(response_ids)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('processing speaking recordings %s failed', response_ids)
+            finally:
+                db.session.remove()
+
+    def _process(self, response_ids):
+        upload_folder = self.app.config['UPLOAD_FOLDER']
+        now = datetime.datetime.utcnow()
+        expires = now + datetime.timedelta(seconds=CLAIM_SECONDS)
+        candidates = db.session.query(SpeakingResponse.id, SpeakingResponse.audio_url)\
+            .filter(SpeakingResponse.id.in_(response_ids), claimable(now)).all()
+        db.session.commit()
+
+        rows = []
+        for response_id, audio_url in candidates:
+            claimed = db.session.query(SpeakingResponse)\
+                .filter(SpeakingResponse.id == response_id, SpeakingResponse.audio_url == audio_url, claimable(now))\
+                .update({'media_status': 'processing', 'media_claim_expires_at': expires},
+                        synchronize_session=False)
+            if claimed:
+                rows.append((response_id, audio_url))
+        db.session.commit()  # no transaction stays open while the workers run
+
+        futures = [(response_id, audio_url, self._process_pool().submit(
+            process_recording, audio_url, upload_folder, self.bitrate, self.max_seconds, self.ffmpeg, self.ffprobe))
+            for response_id, audio_url in rows]
+        for response_id, audio_url, future in futures:
+            try:
+                values = future.result()
+            except Exception as e:
+                values = {'media_status': 'failed', 'media_error': str(e)}
+            values['processed_at'], values['media_claim_expires_at'] = datetime.datetime.utcnow(), None
+            # Skip responses replaced or deleted meanwhile, or taken over after the claim expired
+            db.session.query(SpeakingResponse)\
+                .filter_by(id=response_id, audio_url=audio_url, media_status='processing',
+                           media_claim_expires_at=expires)\
+                .update(values, synchronize_session=False)
+            db.session.commit()
+        if rows and self.on_done:
+            self.on_done()
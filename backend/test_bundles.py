@@ -0,0 +1,94 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from compression import CompressedVariants
+
+
+# Full-test bundles
+#
+# A bundle is the four section payloads of a Test plus a manifest of the
+# media they reference, in one JSON document. It is assembled from the
+# section cache's serialized bodies without re-rendering them; compressed
+# variants are kept with it (see compression.py). The bundle ETag is derived from
+# the test and its four section ETags, so editing any section (which bumps
+# its cache version) yields a new bundle.
+
+class TestBundle(CompressedVariants):
+    def __init__(self, etag, body):
+        self.etag = etag
+        self.body = body
+
+
+def media_manifest(payloads):
+    """Unique media URLs referenced by the payloads (any ``*_url`` key), in
+    document order, with the section type they belong to."""
+    manifest, seen = [], set()
+
+    def walk(value, section_type):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key.endswith('_url') and isinstance(item, str):
+                    if item not in seen:
+                        seen.add(item)
+                        manifest.append({'url': item, 'section': section_type})
+                else:
+                    walk(item, section_type)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item, section_type)
+
+    for section_type, payload in payloads:
+        walk(payload, section_type)
+    return manifest
+
+
+class TestBundleCache:
+    """Latest bundle per test, rebuilt when its ETag changes.
+    ``section_entry(section_type, section_id)`` returns the section cache's
+    CachedSection, or None if the section does not exist."""
+
+    def __init__(self, section_entry, maxsize=64):
+        self.section_entry = section_entry
+        self.maxsize = maxsize
+        self._bundles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, test):
+        """Return the TestBundle of ``test``, or None if one of its sections
+        is missing."""
+        entries = []
+        for section_type, section_id in test.section_ids().items():
+            entry = self.section_entry(section_type, section_id) if section_id else None
+            if entry is None:
+                return None
+            entries.append((section_type, entry))
+
+        digest = hashlib.sha256(f'{test.id}:{test.title}'.encode())
+        for _, entry in entries:
+            digest.update(entry.etag.encode())
+        etag = digest.hexdigest()[:32]
+
+        with self._lock:
+            bundle = self._bundles.get(test.id)
+            if bundle and bundle.etag == etag:
+                self._bundles.move_to_end(test.id)
+                return bundle
+
+        manifest = media_manifest((t, json.loads(entry.body)) for t, entry in entries)
+        head = json.dumps({'id': test.id, 'title': test.title})[:-1].encode()
+        sections = b','.join(b'"%s":%s' % (t.encode(), entry.body) for t, entry in entries)
+        body = head + b',"sections":{' + sections + b'},"media":' + json.dumps(manifest).encode() + b'}'
+
+        bundle = TestBundle(etag, body)
+        with self._lock:
+            self._bundles[test.id] = bundle
+            self._bundles.move_to_end(test.id)
+            while len(self._bundles) > self.maxsize:
+                self._bundles.popitem(last=False)
+        return bundle
+
+    def discard(self, test_id):
+        with self._lock:
+            self._bundles.pop(test_id, None)
@@ -0,0 +1,69 @@
+"""Test setup: app.py reads its configuration from the environment at
+import time, so point it at a throwaway SQLite database and upload folder
+before any test imports it."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BASE_DIR = tempfile.mkdtemp(prefix='backend-tests-')
+os.chdir(BASE_DIR)  # UPLOAD_FOLDER is relative, as in deployments
+os.environ.update({
+    'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(BASE_DIR, "test.db")}',
+    'UPLOAD_FOLDER': 'uploads',
+    'BASE_DIR': BASE_DIR,
+    'SECRET_KEY': 'test-secret-key-test-secret-key-test',
+    'MEDIA_GC_INTERVAL': '0',
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+})
+
+from app import app as flask_app, generate_token  # noqa: E402
+from models import db, User  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _user_headers(app, role):
+    with app.app_context():
+        user = User.query.filter_by(username=f'test-{role}').first()
+        if user is None:
+            user = User(username=f'test-{role}', email=f'{role}@example.com', role=role)
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+        return {'Authorization': f'Bearer {generate_token(user)}'}
+
+
+@pytest.fixture
+def admin_headers(app):
+    return _user_headers(app, 'admin')
+
+
+@pytest.fixture
+def student_headers(app):
+    return _user_headers(app, 'student')
+
+
+READING_SECTION = {'title': 'Reading', 'passages': [{'title': 'Passage', 'text': 'Text', 'questions': [
+    {'type': 'multiple_to_single', 'prompt': 'Q1', 'options': ['w', 'x', 'y', 'z'], 'correct_answer': 'y'},
+]}]}
+
+
+@pytest.fixture
+def reading_section(client, admin_headers):
+    """A new reading section with one question, answered correctly by 'c'."""
+    response = client.post('/reading', json=READING_SECTION, headers=admin_headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
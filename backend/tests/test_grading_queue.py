@@ -0,0 +1,32 @@
+import datetime
+
+import grading_queue
+from models import db, User
+
+QUEUE = 'queue-test'
+
+
+def _students(n):
+    users = [User(username=f'queue-student-{i}', email=f'queue-{i}@example.com', role='student') for i in range(n)]
+    for user in users:
+        user.set_password('password')
+    db.session.add_all(users)
+    db.session.flush()
+    return [user.id for user in users]
+
+
+def test_claims_follow_submission_order(app, reading_section, monkeypatch):
+    clock = iter(datetime.datetime(2025, 1, 1, 0, minute) for minute in range(60))
+    monkeypatch.setattr(grading_queue, '_utcnow', lambda: next(clock))
+    with app.app_context():
+        first, second = _students(2)
+        grading_queue.enqueue(reading_section, QUEUE, first)
+        grading_queue.enqueue(reading_section, QUEUE, second)
+        grading_queue.enqueue(reading_section, QUEUE, first)  # resubmitted: back of the queue
+        db.session.commit()
+
+        claims = [grading_queue.claim_next(QUEUE, reviewer) for reviewer in (101, 102, 103)]
+
+        assert [item.user_id for item in claims[:2]] == [second, first]
+        assert [item.claimed_by for item in claims[:2]] == [101, 102]
+        assert claims[2] is None
@@ -0,0 +1,20 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import request_metrics
+from models import db
+
+
+def test_failed_statement_does_not_skew_sql_timing(app):
+    with app.test_request_context('/'):
+        request_metrics.start_request()
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            conn.execute(text('SELECT 1'))
+            assert not conn.info.get('metrics_started')
+
+        assert g.sql_statements == 1
+        assert 0 <= g.sql_seconds < 1
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from benchmarks.common import make_app
+from benchmarks.query_plans import check_plans
+from models import db
+
+
+def _scans(engine):
+    with engine.connect() as conn:
+        return [f'{name}: {" | ".join(plan)}' for name, plan, ok in check_plans(conn) if not ok]
+
+
+def test_hot_lookups_use_an_index_on_sqlite(app):
+    with app.app_context():
+        assert _scans(db.engine) == []
+
+
+@pytest.mark.skipif(not os.environ.get('BENCH_DATABASE_URI', '').startswith('postgresql'),
+                    reason='set BENCH_DATABASE_URI to a PostgreSQL database to check its plans')
+def test_hot_lookups_use_an_index_on_postgresql():
+    pg_app = make_app(os.environ['BENCH_DATABASE_URI'])
+    with pg_app.app_context():
+        assert _scans(db.engine) == []
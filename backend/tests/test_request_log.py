@@ -0,0 +1,43 @@
+import io
+import json
+
+import pytest
+from flask import Flask
+
+from request_log import RequestLogger
+
+
+@pytest.fixture
+def logged_app():
+    app = Flask(__name__)
+    stream = io.StringIO()
+    logger = RequestLogger(app, stream=stream)
+
+    @app.route('/ok')
+    def ok():
+        return 'ok'
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    yield app, logger, stream
+    logger.logger.removeHandler(logger.logger.handlers[-1])
+
+
+def _lines(logger, stream):
+    logger.listener.stop()  # drains the queue
+    logger.listener.start()  # stopped again at exit
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_unhandled_exception_is_logged_as_500(logged_app):
+    app, logger, stream = logged_app
+    client = app.test_client()
+
+    assert client.get('/ok').status_code == 200
+    assert client.get('/boom').status_code == 500
+
+    ok, boom = _lines(logger, stream)
+    assert (ok['route'], ok['status'], ok['response_bytes']) == ('/ok', 200, 2)
+    assert (boom['route'], boom['status'], boom['error']) == ('/boom', 500, 'RuntimeError')
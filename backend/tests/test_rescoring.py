@@ -0,0 +1,48 @@
+import datetime
+import time
+
+import app as app_module
+from models import db, RescoreJob
+from rescoring import STALE_SECONDS
+
+
+def wait_for(client, admin_headers, job_id):
+    for _ in range(100):
+        job = client.get(f'/rescore-jobs/{job_id}', headers=admin_headers).get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish: {job}')
+
+
+def test_correct_answer_change_rescores_attempts(client, admin_headers, student_headers, reading_section):
+    section_id = reading_section
+    passage = client.get(f'/reading/{section_id}').get_json()['passages'][0]
+    question_id = passage['questions'][0]['id']
+    answers = {str(passage['id']): {str(question_id): ['c']}}
+    assert client.post(f'/reading/{section_id}/submit', json={'answers': answers},
+                       headers=student_headers).get_json()['score'] == 1
+
+    response = client.put(f'/questions/{question_id}/correct-answers', json={'correct_answer': 'w'},
+                          headers=admin_headers)
+    assert response.status_code == 202
+    assert wait_for(client, admin_headers, response.get_json()['id'])['status'] == 'done'
+
+    attempts = client.get(f'/attempts?section_id={section_id}', headers=admin_headers).get_json()['attempts']
+    assert [a['score'] for a in attempts] == [0]
+
+
+def test_jobs_of_a_stopped_worker_are_resumed(app, client, admin_headers, reading_section):
+    section_id = reading_section
+    old = datetime.datetime.utcnow() - datetime.timedelta(seconds=STALE_SECONDS + 1)
+    with app.app_context():
+        stale = RescoreJob(section_id=section_id, status='running', heartbeat_at=old)
+        live = RescoreJob(section_id=section_id, status='running', heartbeat_at=datetime.datetime.utcnow())
+        db.session.add_all([stale, live])
+        db.session.commit()
+        stale_id, live_id = stale.id, live.id
+
+        app_module.rescore_runner.resume_stale()
+
+    assert wait_for(client, admin_headers, stale_id)['status'] == 'done'
+    assert client.get(f'/rescore-jobs/{live_id}', headers=admin_headers).get_json()['status'] == 'running'
@@ -0,0 +1,46 @@
+import pytest
+
+from section_cache import SectionCache, VersionedSectionCache
+
+
+def test_versioned_cache_requires_load():
+    class Incomplete(VersionedSectionCache):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(SectionCache())
+
+
+class CountingCache(VersionedSectionCache):
+    def __init__(self, section_cache, maxsize=None):
+        super().__init__(section_cache, maxsize)
+        self.loads = []
+
+    def load(self, section_id, section_type, version):
+        self.loads.append(section_id)
+        return (section_id, version)
+
+
+class FixedVersionCache(SectionCache):
+    def version(self, section_id):
+        return 1
+
+
+def test_versioned_cache_is_bounded():
+    values = CountingCache(FixedVersionCache(), maxsize=2)
+    for section_id in (1, 2, 1, 3, 1, 2):
+        values.get(section_id, 'reading')
+
+    assert values.loads == [1, 2, 3, 2]  # 2 was the least recently used when 3 came in
+    assert len(values._values) == 2
+
+
+def test_bump_drops_versioned_values(app, reading_section):
+    with app.app_context():
+        values = CountingCache(SectionCache())
+        values.get(reading_section, 'reading')
+        values.section_cache.bump(reading_section)
+
+        assert not values._values
+        values.get(reading_section, 'reading')
+        assert values.loads == [reading_section, reading_section]
@@ -0,0 +1,35 @@
+def test_delete_section_with_attempts_is_rejected(client, admin_headers, student_headers, reading_section):
+    section_id = reading_section
+    section = client.get(f'/reading/{section_id}').get_json()
+    passage = section['passages'][0]
+    answers = {str(passage['id']): {str(passage['questions'][0]['id']): ['c']}}
+    submitted = client.post(f'/reading/{section_id}/submit', json={'answers': answers}, headers=student_headers)
+    assert submitted.status_code == 200
+    assert submitted.get_json()['score'] == 1
+
+    response = client.delete(f'/reading/{section_id}', headers=admin_headers)
+
+    assert response.status_code == 409
+    assert client.get(f'/reading/{section_id}').status_code == 200
+    attempts = client.get(f'/attempts?section_id={section_id}', headers=admin_headers).get_json()['attempts']
+    assert len(attempts) == 1
+
+
+def test_delete_missing_section(client, admin_headers):
+    assert client.delete('/reading/999999', headers=admin_headers).status_code == 404
+
+
+def test_list_all_section_types(client, reading_section):
+    listed, cursor = [], None
+    while True:
+        page = client.get('/sections?limit=2' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        listed.extend(section['id'] for section in page['sections'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert reading_section in listed
+    assert listed == sorted(listed)
+    assert page['total'] == len(listed)
+    listening = client.get('/sections?type=listening').get_json()['sections']
+    assert {section['type'] for section in listening} <= {'listening'}
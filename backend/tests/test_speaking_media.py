@@ -0,0 +1,31 @@
+import os
+
+from media_store import BLOB_FOLDER
+import speaking_media
+from speaking_media import OUTPUT_EXT, process_recording
+
+WEBM_HEADER = b'\x1a\x45\xdf\xa3' + b'\x00' * 60
+MP3_FRAMES = b'\xff\xfb\x90\x64' + b'\x00' * 4000  # what the fake transcoder "outputs"
+
+
+def fake_transcode(src, dest, ffmpeg, bitrate):
+    with open(dest, 'wb') as f:
+        f.write(MP3_FRAMES)
+
+
+def test_transcoded_recording_is_stored_and_served_as_mp3(app, client, monkeypatch):
+    upload_folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(os.path.join(upload_folder, 'speaking_responses'), exist_ok=True)
+    with open(os.path.join(upload_folder, 'speaking_responses', 'rec.webm'), 'wb') as f:
+        f.write(WEBM_HEADER)
+    monkeypatch.setattr(speaking_media, 'transcode', fake_transcode)
+
+    result = process_recording(f'/{upload_folder}/speaking_responses/rec.webm', upload_folder,
+                               '64k', 600, ffmpeg='ffmpeg')
+
+    assert result['media_status'] == 'ready'
+    assert result['audio_url'].startswith(f'/{upload_folder}/{BLOB_FOLDER}/')
+    assert result['audio_url'].endswith(OUTPUT_EXT)
+    response = client.get(f"/files{result['audio_url']}")
+    assert response.status_code == 200
+    assert response.mimetype == 'audio/mpeg'
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Request, current_app
+
+from media_store import store_blob
+
+CHUNK_SIZE = 64 * 1024
+STAGING_FOLDER = '.staging'
+
+
+# Upload pipeline
+#
+# 1. While the multipart body is parsed, every uploaded file is written
+#    chunk by chunk into a temp file in UPLOAD_FOLDER/.staging and hashed
+#    on the fly (StagingRequest / StagedUpload).
+# 2. persist_upload fsyncs the temp file and renames it into the
+#    content-addressed media store (see media_store.py). The rename is
+#    atomic because staging lives on the same filesystem.
+# 3. UploadPool runs step 2 for all files of a request in parallel, so
+#    handlers only open their DB transaction once every file is durable.
+
+class StagedUpload:
+    """Temp file that hashes everything written into it. Removed on close
+    unless it was persisted."""
+
+    def __init__(self, staging_dir):
+        fd, self.path = tempfile.mkstemp(dir=staging_dir, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.persisted = False
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # read, seek, tell, flush, fileno... go to the underlying file
+        return getattr(self._file, name)
+
+    def close(self):
+        self._file.close()
+        if not self.persisted:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class StagingRequest(Request):
+    """Request whose uploaded files are streamed into StagedUpload files."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return StagedUpload(staging_dir(current_app.config['UPLOAD_FOLDER']))
+
+
+def staging_dir(upload_folder):
+    path = os.path.join(upload_folder, STAGING_FOLDER)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stage_stream(stream, upload_folder):
+    """Copy a stream that was not staged while parsing into a StagedUpload."""
+    staged = StagedUpload(staging_dir(upload_folder))
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        staged.write(chunk)
+    return staged
+
+
+def persist_upload(file, upload_folder):
+    """Durably store an uploaded file and return its URL."""
+    staged = file.stream if isinstance(file.stream, StagedUpload) else stage_stream(file.stream, upload_folder)
+    return store_blob(staged, upload_folder, file.filename)
+
+
+class UploadPool:
+    """Thread pool for persisting uploads. At most ``max_workers * 2`` jobs
+    are in flight across all requests; further submits wait for a slot."""
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+
+    def submit(self, fn, *args):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def persist_all(self, files, upload_folder):
+        """Persist a list of files (None entries allowed) in parallel and
+        return their URLs in the same order."""
+        futures = [self.submit(persist_upload, file, upload_folder) if file else None for file in files]
+        return [future.result() if future else None for future in futures]